@@ -0,0 +1,66 @@
+"""
+Startup-time benchmark for the `crystred` command.
+
+Times `crystred <command> --help` for every subcommand (which imports the command's
+module but does no work) and checks that none of them pulls in the heavy libraries at
+import time. Exits non-zero if a command is slower than --max-ms or imports one of them.
+
+    python manual-tests/bench_startup.py [--repeats 5] [--max-ms 500]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from crystred.cli import SUBCOMMANDS
+
+HEAVY_MODULES = ["matplotlib", "pandas", "numpy", "regex", "scipy"]
+
+
+def time_command(args: list[str], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "crystred.cli", *args], stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def heavy_imports(module_name: str) -> list[str]:
+    code = (
+        "import importlib, sys; "
+        f"importlib.import_module({module_name!r}); "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crystred startup time.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    baseline = time_command(["--help"], args.repeats)
+    print(f"{'crystred --help':<36} {baseline:7.0f} ms")
+
+    failed = False
+    for name, (target, _) in SUBCOMMANDS.items():
+        elapsed = time_command([name, "--help"], args.repeats)
+        heavy = heavy_imports(target.split(":")[0])
+
+        status = "ok"
+        if elapsed > args.max_ms or heavy:
+            status = "SLOW" if not heavy else f"imports {', '.join(heavy)}"
+            failed = True
+
+        print(f"{'crystred ' + name + ' --help':<36} {elapsed:7.0f} ms   {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
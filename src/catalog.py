@@ -0,0 +1,292 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from . import subset
+
+LASER_STATES = {"dark": 0, "light": 1}
+UNKNOWN_LASER_STATE = 255
+INTEGER_EVENT = -1
+CATALOG_FORMAT = 2
+
+
+def laser_state_code(laser_state: str | None) -> int:
+    return LASER_STATES.get(laser_state, UNKNOWN_LASER_STATE)
+
+
+def laser_state_name(code: int) -> str:
+    for name, value in LASER_STATES.items():
+        if value == code:
+            return name
+    return "unknown"
+
+
+def _split_event(event: str) -> tuple[int, str | None]:
+    # (integer id, None) for plain integer ids, else (0, the id as written) -- e.g. "0/0",
+    # or "" for an image without an event
+    event = event.strip().removeprefix("//")
+    try:
+        number = int(event)
+    except ValueError:
+        return 0, event
+    if str(number) != event or not np.iinfo(np.int64).min <= number <= np.iinfo(np.int64).max:
+        return 0, event
+    return number, None
+
+
+class EventCatalog:
+    """
+    A set of (image file, event) pairs with a laser state each, held in NumPy arrays:
+    file names are interned into `filenames` and referenced by index from `file_ids`
+    (uint32), next to `events` (int64) and `laser_states` (uint8, see LASER_STATES).
+
+    Integer event ids live in `events`. Anything else (e.g. "0/0", or "" for an image
+    without an event) is interned into `event_labels` and referenced from `label_ids`
+    (int32, INTEGER_EVENT where `events` holds the id). Saved catalogs are loaded
+    memory-mapped.
+    """
+
+    def __init__(
+        self,
+        filenames: list[str],
+        file_ids: np.ndarray,
+        events: np.ndarray,
+        laser_states: np.ndarray,
+        event_labels: list[str] | None = None,
+        label_ids: np.ndarray | None = None,
+    ):
+        self.filenames = filenames
+        self.file_ids = file_ids
+        self.events = events
+        self.laser_states = laser_states
+        self.event_labels = event_labels if event_labels is not None else []
+        self.label_ids = label_ids if label_ids is not None else np.full(len(events), INTEGER_EVENT, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @classmethod
+    def _from_pairs(cls, pairs: Iterable[tuple[str, str, int]]) -> "EventCatalog":
+        ids: dict[str, int] = {}
+        labels: dict[str, int] = {}
+        file_ids, events, label_ids, laser_states = [], [], [], []
+        for filename, event, laser_state in pairs:
+            number, label = _split_event(event)
+            file_ids.append(ids.setdefault(filename, len(ids)))
+            events.append(number)
+            label_ids.append(INTEGER_EVENT if label is None else labels.setdefault(label, len(labels)))
+            laser_states.append(laser_state)
+        return cls(
+            list(ids),
+            np.array(file_ids, dtype=np.uint32),
+            np.array(events, dtype=np.int64),
+            np.array(laser_states, dtype=np.uint8),
+            list(labels),
+            np.array(label_ids, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_list_files(cls, list_files: Iterable[Path], laser_state: str | None = None) -> "EventCatalog":
+        """
+        Catalog the "<file> //<event>" lines of list files. Without `laser_state`, it is
+        taken from the list file name (`acqNNNN.<detector>.<laser_state>.lst`).
+        """
+
+        def pairs():
+            for list_file in list_files:
+                suffixes = Path(list_file).suffixes
+                code = laser_state_code(laser_state or (suffixes[-2].lstrip(".") if len(suffixes) > 1 else None))
+                with open(list_file, "r") as f:
+                    for line in f:
+                        fields = line.split()
+                        if fields:
+                            has_event = len(fields) > 1 and fields[1].startswith("//")
+                            yield fields[0], fields[1] if has_event else "", code
+
+        return cls._from_pairs(pairs())
+
+    @classmethod
+    def from_streams(cls, streams: Iterable[Path], laser_state: str | None = None) -> "EventCatalog":
+        """Catalog every chunk (image) of the given streams."""
+
+        code = laser_state_code(laser_state)
+
+        def pairs():
+            for stream in streams:
+                for chunk in subset.index_stream(stream).chunks:
+                    yield chunk.filename, chunk.event, code
+
+        return cls._from_pairs(pairs())
+
+    @staticmethod
+    def _remap(names: list[str], table: dict[str, int], dtype) -> np.ndarray:
+        return np.array([table.setdefault(name, len(table)) for name in names], dtype=dtype)
+
+    @classmethod
+    def concatenate(cls, catalogs: list["EventCatalog"]) -> "EventCatalog":
+        ids: dict[str, int] = {}
+        labels: dict[str, int] = {}
+        file_ids, label_ids = [], []
+        for cat in catalogs:
+            file_remap = cls._remap(cat.filenames, ids, np.uint32)
+            # one extra slot at the end, so INTEGER_EVENT (-1) indexes to itself
+            label_remap = np.append(cls._remap(cat.event_labels, labels, np.int32), np.int32(INTEGER_EVENT))
+            file_ids.append(file_remap[cat.file_ids] if len(cat) else np.zeros(0, dtype=np.uint32))
+            label_ids.append(label_remap[cat.label_ids] if len(cat) else np.zeros(0, dtype=np.int32))
+        return cls(
+            list(ids),
+            np.concatenate(file_ids) if file_ids else np.zeros(0, dtype=np.uint32),
+            np.concatenate([c.events for c in catalogs]) if catalogs else np.zeros(0, dtype=np.int64),
+            np.concatenate([c.laser_states for c in catalogs]) if catalogs else np.zeros(0, dtype=np.uint8),
+            list(labels),
+            np.concatenate(label_ids) if label_ids else np.zeros(0, dtype=np.int32),
+        )
+
+    # -- set operations -------------------------------------------------------
+
+    def _rows(self) -> np.ndarray:
+        # one (file id, label id, event) row per event; any int64 event id is kept exactly
+        return np.stack([self.file_ids.astype(np.int64), self.label_ids.astype(np.int64), self.events], axis=1)
+
+    def _rows_in(self, other: "EventCatalog") -> tuple[np.ndarray, np.ndarray]:
+        # this catalog's rows in `other`'s file and label ids, and which of them `other` could hold at all
+        other_files = {name: i for i, name in enumerate(other.filenames)}
+        other_labels = {label: i for i, label in enumerate(other.event_labels)}
+        file_remap = np.array([other_files.get(name, -1) for name in self.filenames], dtype=np.int64)
+        label_remap = np.array([other_labels.get(label, -2) for label in self.event_labels] + [INTEGER_EVENT], dtype=np.int64)
+
+        rows = self._rows()
+        rows[:, 0] = file_remap[self.file_ids] if len(self) else 0
+        rows[:, 1] = label_remap[self.label_ids]
+        known = (rows[:, 0] >= 0) & (rows[:, 1] >= INTEGER_EVENT)
+        return rows, known
+
+    def isin(self, other: "EventCatalog") -> np.ndarray:
+        """Boolean mask: which of this catalog's events are also in `other`."""
+        rows, known = self._rows_in(other)
+        # number every distinct row of both catalogs, then compare the numbers
+        _, inverse = np.unique(np.concatenate([rows, other._rows()]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        return known & np.isin(inverse[:len(self)], inverse[len(self):])
+
+    def contains(self, filename: str, event: str | int) -> bool:
+        try:
+            file_id = self.filenames.index(filename)
+        except ValueError:
+            return False
+        number, label = _split_event(str(event))
+        if label is None:
+            return bool(np.any((self.file_ids == file_id) & (self.label_ids == INTEGER_EVENT) & (self.events == number)))
+        if label not in self.event_labels:
+            return False
+        return bool(np.any((self.file_ids == file_id) & (self.label_ids == self.event_labels.index(label))))
+
+    def subset(self, mask: np.ndarray) -> "EventCatalog":
+        return EventCatalog(
+            self.filenames,
+            self.file_ids[mask],
+            self.events[mask],
+            self.laser_states[mask],
+            self.event_labels,
+            self.label_ids[mask],
+        )
+
+    def intersection(self, other: "EventCatalog") -> "EventCatalog":
+        return self.subset(self.isin(other))
+
+    def difference(self, other: "EventCatalog") -> "EventCatalog":
+        return self.subset(~self.isin(other))
+
+    def union(self, other: "EventCatalog") -> "EventCatalog":
+        return EventCatalog.concatenate([self, other.difference(self)])
+
+    def select(self, laser_state: str) -> "EventCatalog":
+        return self.subset(self.laser_states == laser_state_code(laser_state))
+
+    def unique(self) -> "EventCatalog":
+        _, first = np.unique(self._rows(), axis=0, return_index=True)
+        return self.subset(np.sort(first))
+
+    def integer_events(self) -> np.ndarray:
+        """The integer event ids, leaving out labelled and missing events."""
+        return self.events[self.label_ids == INTEGER_EVENT]
+
+    # -- input / output -------------------------------------------------------
+
+    def save(self, directory: Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "file_ids.npy", self.file_ids)
+        np.save(directory / "events.npy", self.events)
+        np.save(directory / "laser_states.npy", self.laser_states)
+        np.save(directory / "label_ids.npy", self.label_ids)
+        with (directory / "filenames.json").open("w") as f:
+            json.dump(self.filenames, f)
+        with (directory / "event_labels.json").open("w") as f:
+            json.dump(self.event_labels, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "EventCatalog":
+        directory = Path(directory)
+        mmap_mode = "r" if mmap else None
+        with (directory / "filenames.json").open("r") as f:
+            filenames = json.load(f)
+        with (directory / "event_labels.json").open("r") as f:
+            event_labels = json.load(f)
+        return cls(
+            filenames,
+            np.load(directory / "file_ids.npy", mmap_mode=mmap_mode),
+            np.load(directory / "events.npy", mmap_mode=mmap_mode),
+            np.load(directory / "laser_states.npy", mmap_mode=mmap_mode),
+            event_labels,
+            np.load(directory / "label_ids.npy", mmap_mode=mmap_mode),
+        )
+
+    def write_custom_split(self, path: Path) -> None:
+        """Write "<file> //<event> <laser state>" lines, as partialator --custom-split expects."""
+        names = {code: laser_state_name(code) for code in np.unique(self.laser_states).tolist()}
+        with open(path, "w") as f:
+            rows = zip(self.file_ids.tolist(), self.events.tolist(), self.label_ids.tolist(), self.laser_states.tolist())
+            for file_id, event, label_id, state in rows:
+                event_id = str(event) if label_id == INTEGER_EVENT else self.event_labels[label_id]
+                event_field = f" //{event_id}" if event_id else ""
+                f.write(f"{self.filenames[file_id]}{event_field} {names[state]}\n")
+
+
+def _source_signature(sources: dict[str, list[Path]]) -> dict:
+    # the format number invalidates catalogs saved by an older layout
+    signature = {"format": CATALOG_FORMAT}
+    for laser_state, paths in sources.items():
+        for path in paths:
+            stat = os.stat(path)
+            signature[str(path)] = [laser_state, stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def load_or_build_from_streams(directory: Path, streams_by_laser_state: dict[str, list[Path]]) -> EventCatalog:
+    """
+    Load the catalog saved in `directory` if it was built from exactly these streams, as
+    they are now on disk; otherwise build it from the streams and save it there.
+    """
+
+    directory = Path(directory)
+    signature = _source_signature(streams_by_laser_state)
+    signature_path = directory / "sources.json"
+
+    if signature_path.exists():
+        with signature_path.open("r") as f:
+            if json.load(f) == signature:
+                return EventCatalog.load(directory)
+
+    catalog = EventCatalog.concatenate([
+        EventCatalog.from_streams(paths, laser_state)
+        for laser_state, paths in streams_by_laser_state.items()
+    ])
+    catalog.save(directory)
+    with signature_path.open("w") as f:
+        json.dump(signature, f)
+
+    return catalog
@@ -0,0 +1,267 @@
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from . import streamio
+from . import subset
+
+CELL_PARAMETERS = subset.CELL_PARAMETERS
+
+# fixed binning, so histograms from different shards always line up:
+# 1 pm for lengths (nm), 0.01 deg for angles
+HISTOGRAM_BINNING = {
+    "a": (0.0, 100.0, 100_000),
+    "b": (0.0, 100.0, 100_000),
+    "c": (0.0, 100.0, 100_000),
+    "alpha": (0.0, 180.0, 18_000),
+    "beta": (0.0, 180.0, 18_000),
+    "gamma": (0.0, 180.0, 18_000),
+}
+
+class MomentAccumulator:
+    """
+    Running count, mean and second/third central moment sums of a sample.
+
+    Values are added with Welford's update and two accumulators are combined with the
+    pairwise formulas of Chan et al. / Pébay, so sharded results merge to the same
+    statistics as one pass over all the data. `std` and `skew` follow pandas' definitions
+    (ddof=1 and the adjusted Fisher-Pearson coefficient).
+    """
+
+    __slots__ = ("n", "mean", "m2", "m3", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float) -> None:
+        n1 = self.n
+        self.n += 1
+        delta = x - self.mean
+        delta_n = delta / self.n
+        term1 = delta * delta_n * n1
+        self.mean += delta_n
+        self.m3 += term1 * delta_n * (self.n - 2) - 3 * delta_n * self.m2
+        self.m2 += term1
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other: "MomentAccumulator") -> None:
+        if other.n == 0:
+            return
+        if self.n == 0:
+            for attr in self.__slots__:
+                setattr(self, attr, getattr(other, attr))
+            return
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+
+        m3 = (self.m3 + other.m3
+              + delta**3 * na * nb * (na - nb) / n**2
+              + 3 * delta * (na * other.m2 - nb * self.m2) / n)
+        m2 = self.m2 + other.m2 + delta**2 * na * nb / n
+
+        self.n = n
+        self.mean += delta * nb / n
+        self.m2 = m2
+        self.m3 = m3
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        if self.n < 2:
+            return math.nan
+        return math.sqrt(self.m2 / (self.n - 1))
+
+    @property
+    def skew(self) -> float:
+        if self.n < 3:
+            return math.nan
+        if self.m2 == 0:
+            return 0.0
+        return self.n * math.sqrt(self.n - 1) / (self.n - 2) * self.m3 / self.m2**1.5
+
+    def to_dict(self) -> dict:
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MomentAccumulator":
+        acc = cls()
+        for attr in cls.__slots__:
+            setattr(acc, attr, data[attr])
+        return acc
+
+
+class Histogram:
+    """Fixed-bin histogram; histograms with the same binning merge by adding counts."""
+
+    def __init__(self, low: float, high: float, bins: int):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, x: float) -> None:
+        i = math.floor((x - self.low) / (self.high - self.low) * self.bins)
+        if i < 0:
+            self.underflow += 1
+        elif i >= self.bins:
+            self.overflow += 1
+        else:
+            self.counts[i] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        if (self.low, self.high, self.bins) != (other.low, other.high, other.bins):
+            raise ValueError("cannot merge histograms with different binning")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def quantile(self, q: float) -> float:
+        """Quantile estimate, interpolating linearly within the bin it falls in."""
+
+        total = int(self.counts.sum()) + self.underflow + self.overflow
+        if total == 0:
+            return math.nan
+
+        target = q * total
+        if target < self.underflow:
+            return self.low
+        cumulative = np.cumsum(self.counts) + self.underflow
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        if i >= self.bins:
+            return self.high
+
+        below = cumulative[i] - self.counts[i]
+        fraction = (target - below) / self.counts[i] if self.counts[i] else 0.0
+        width = (self.high - self.low) / self.bins
+        return self.low + (i + fraction) * width
+
+    def to_dict(self) -> dict:
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "low": self.low,
+            "high": self.high,
+            "bins": self.bins,
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+            "nonzero_bins": nonzero.tolist(),
+            "nonzero_counts": self.counts[nonzero].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        hist = cls(data["low"], data["high"], data["bins"])
+        hist.counts[data["nonzero_bins"]] = data["nonzero_counts"]
+        hist.underflow = data["underflow"]
+        hist.overflow = data["overflow"]
+        return hist
+
+
+class UnitCellAccumulator:
+    """
+    Constant-memory statistics of the six unit cell parameters of a set of crystals:
+    moments (mean, std, skew) plus histograms for medians and other quantiles.
+    """
+
+    def __init__(self):
+        self.moments = {name: MomentAccumulator() for name in CELL_PARAMETERS}
+        self.histograms = {name: Histogram(*HISTOGRAM_BINNING[name]) for name in CELL_PARAMETERS}
+
+    @property
+    def count(self) -> int:
+        return self.moments["a"].n
+
+    def add(self, cell: tuple[float, ...]) -> None:
+        for name, value in zip(CELL_PARAMETERS, cell):
+            self.moments[name].add(value)
+            self.histograms[name].add(value)
+
+    def merge(self, other: "UnitCellAccumulator") -> None:
+        for name in CELL_PARAMETERS:
+            self.moments[name].merge(other.moments[name])
+            self.histograms[name].merge(other.histograms[name])
+
+    def quantile(self, name: str, q: float) -> float:
+        return self.histograms[name].quantile(q)
+
+    def summary(self) -> dict:
+        """Flat dict: `indexed`, then mean_/std_/skew_/median_ for every parameter."""
+        stats: dict = {"indexed": self.count}
+        for prefix in ("mean", "std", "skew", "median"):
+            for name in CELL_PARAMETERS:
+                if prefix == "median":
+                    stats[f"median_{name}"] = self.quantile(name, 0.5)
+                else:
+                    stats[f"{prefix}_{name}"] = getattr(self.moments[name], prefix)
+        return stats
+
+    def to_dict(self) -> dict:
+        return {
+            "moments": {name: m.to_dict() for name, m in self.moments.items()},
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UnitCellAccumulator":
+        acc = cls()
+        acc.moments = {name: MomentAccumulator.from_dict(data["moments"][name]) for name in CELL_PARAMETERS}
+        acc.histograms = {name: Histogram.from_dict(data["histograms"][name]) for name in CELL_PARAMETERS}
+        return acc
+
+    def save(self, path: Path) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: Path) -> "UnitCellAccumulator":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def stream_to_unitcell_statistics(stream_file_path: str | Path) -> UnitCellAccumulator:
+    acc = UnitCellAccumulator()
+
+    with streamio.open_stream(stream_file_path, "rb") as stream_f:
+        for line in stream_f:
+            if line.startswith(b"Cell parameters"):
+                match = subset.CELL_PATTERN.match(line)
+                if match:
+                    acc.add(tuple(float(val) for val in match.groups()))
+
+    return acc
+
+
+def accumulate_index(stream_index: subset.StreamIndex) -> UnitCellAccumulator:
+    """Cell statistics of the crystals in an already indexed stream."""
+
+    acc = UnitCellAccumulator()
+    for crystal in stream_index.crystals():
+        if crystal.cell is not None:
+            acc.add(crystal.cell)
+
+    return acc
+
+
+def streams_to_unitcell_statistics(stream_file_paths: list[str | Path], processes: int | None = None) -> UnitCellAccumulator:
+    """Accumulate several streams, one worker process per file, and merge the results."""
+
+    total = UnitCellAccumulator()
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for acc in pool.map(stream_to_unitcell_statistics, stream_file_paths):
+            total.merge(acc)
+
+    return total
@@ -0,0 +1,46 @@
+import importlib
+import sys
+
+# subcommand -> ("module:function", help). Modules are imported only when their
+# subcommand runs, so `crystred` itself starts with nothing but the standard library.
+SUBCOMMANDS = {
+    "optimize-geometry": ("crystred.scripts.optimize_each_runs_geometry:main", "Optimize detector geometry for each run."),
+    "index-all-runs": ("crystred.scripts.index_all_runs:main", "Index all runs using a SwissFEL config."),
+    "index-summary": ("crystred.scripts.index_summary:main", "Summarize the indexing of every run into a cached table."),
+    "sweep-indexing": ("crystred.scripts.sweep_indexing:main", "Sweep indexing parameters on a subsample and rank them."),
+    "merge-runset": ("crystred.scripts.merge_runset:main", "Merge a set of runs with partialator."),
+    "compile-stats": ("crystred.scripts.compile_stats:main", "Compile per-shell statistics for all merged datasets."),
+    "custom-split": ("crystred.scripts.custom_split:main", "Build a custom-split list and submit partialator."),
+    "filter": ("crystred.scripts.filter_stream:main", "Write a stream with only the crystals passing filters."),
+    "convert-streams": ("crystred.scripts.convert_streams:main", "Compress or decompress stream files."),
+}
+
+
+def print_usage(file=sys.stdout) -> None:
+    print("usage: crystred <command> [options]\n\ncommands:", file=file)
+    width = max(len(name) for name in SUBCOMMANDS)
+    for name, (_, help_text) in SUBCOMMANDS.items():
+        print(f"  {name:<{width}}  {help_text}", file=file)
+    print("\nrun `crystred <command> -h` for the options of a command", file=file)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print_usage()
+        sys.exit(0 if len(sys.argv) > 1 else 2)
+
+    name = sys.argv[1]
+    if name not in SUBCOMMANDS:
+        print(f"crystred: unknown command `{name}`\n", file=sys.stderr)
+        print_usage(file=sys.stderr)
+        sys.exit(2)
+
+    module_name, function_name = SUBCOMMANDS[name][0].split(":")
+
+    # let the subcommand's argparse see itself as `crystred <name>`
+    sys.argv = [f"crystred {name}"] + sys.argv[2:]
+    getattr(importlib.import_module(module_name), function_name)()
+
+
+if __name__ == "__main__":
+    main()
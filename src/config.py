@@ -1,6 +1,7 @@
 
 from glob import glob
 from pathlib import Path
+from typing import Literal
 
 import yaml
 from pydantic import BaseModel
@@ -26,6 +27,15 @@ class GeometryOptimizationConfig(BaseModel):
     clen_half_range: int
     run_range: tuple[int, int]
 
+    # before scanning a run, index a small probe with the last optimized geometry and
+    # reuse it if cell statistics and det_shift agree within these tolerances
+    reuse_geometry: bool = True
+    reuse_probe_size: int = 1000
+    reuse_min_crystals: int = 50
+    reuse_cell_tolerance: float = 0.002     # relative change of mean a, b, c
+    reuse_spread_tolerance: float = 0.25    # relative increase of std a, b, c
+    reuse_det_shift_tolerance: float = 0.05  # mm, mean predict_refine/det_shift
+
 
 class MergingConfig(BaseModel):
     use_online_streams: bool
@@ -40,6 +50,33 @@ class StatsConfig(BaseModel):
     stats_highres: float
 
 
+class SweepConfig(BaseModel):
+    # IndexingConfig field name -> values to try
+    parameters: dict[str, list[str | int | float]]
+    mode: Literal["grid", "random"] = "grid"
+    n_samples: int | None = None  # random mode: number of configurations to draw
+    sample_size: int = 2000
+
+
+class ExecutorConfig(BaseModel):
+    backend: Literal["slurm", "local"] = "slurm"
+    max_cpus: int | None = None  # local only, defaults to all CPUs on the machine
+    cpus_per_job: int = 4        # local only, the most CPUs any one job gets
+    stage_to_scratch: bool = False
+    scratch_directory: str = "${TMPDIR:-/tmp}"  # expanded by the job's shell, on the node
+
+
+class ResourcesConfig(BaseModel):
+    images_per_cpu_hour: float = 2000.0
+    target_hours: float = 2.0
+    time_safety_factor: float = 2.0
+    node_cpus: int = 36
+    min_cpus: int = 4
+    mem_gb_per_cpu: float = 2.0
+    min_minutes: int = 30
+    max_hours: float = 23.0
+
+
 class SwissFELConfig(BaseModel):
     beamline: str
     experiment_id: str
@@ -62,6 +99,9 @@ class SwissFELConfig(BaseModel):
     geometry_optimization: GeometryOptimizationConfig
     merging: MergingConfig
     stats: StatsConfig
+    executor: ExecutorConfig = ExecutorConfig()
+    resources: ResourcesConfig = ResourcesConfig()
+    sweep: SweepConfig | None = None
 
     @classmethod
     def from_yaml(cls, path: Path) -> "SwissFELConfig":
@@ -0,0 +1,299 @@
+import abc
+import itertools
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from tqdm import tqdm
+
+from . import utils
+from . import config
+from .resources import JobResources, pack_jobs
+
+
+class Executor(abc.ABC):
+    """Runs generated job scripts and tracks them by integer job id."""
+
+    @abc.abstractmethod
+    def submit(
+        self,
+        script_text: str,
+        *,
+        queue: str = "day",
+        jobname: str = "indexing",
+        time: str = "23:00:00",
+        resources: JobResources | None = None,
+    ) -> int:
+        """
+        Run one job script. Without `resources` the job gets a whole node for `time`;
+        otherwise `resources` decides CPUs, memory and wall time.
+        """
+
+    def submit_packed(self, jobs: list[tuple[str, JobResources]], *, queue: str = "day", jobname: str = "indexing") -> list[int]:
+        """
+        Run many small, independent job scripts. Returns one job id per script; backends
+        that share an allocation between scripts may return the same id more than once.
+        """
+        return [self.submit(script_text, queue=queue, jobname=jobname, resources=r) for script_text, r in jobs]
+
+    def submit_array(self, script_texts: list[str], *, resources: JobResources, queue: str = "day", jobname: str = "indexing") -> list[int]:
+        """
+        Run many job scripts of the same size as one job array where the backend has them.
+        Returns one job id per script, as `submit_packed` does.
+        """
+        return [self.submit(script_text, queue=queue, jobname=jobname, resources=resources) for script_text in script_texts]
+
+    @abc.abstractmethod
+    def wait(self, job_ids: set[int]) -> None:
+        """Block until every job in `job_ids` has finished."""
+
+    def shutdown(self) -> None:
+        """Block until every job this executor owns has finished, if it owns any."""
+        pass
+
+
+class SlurmExecutor(Executor):
+
+    def __init__(self, *, node_cpus: int = 36):
+        self.node_cpus = node_cpus
+
+    def submit(
+        self,
+        script_text: str,
+        *,
+        queue: str = "day",
+        jobname: str = "indexing",
+        time: str = "23:00:00",
+        resources: JobResources | None = None,
+    ) -> int:
+        if resources is None:
+            resources = JobResources(time=time)
+        return self._sbatch(script_text, queue=queue, jobname=jobname, resources=resources)
+
+    def submit_packed(self, jobs: list[tuple[str, JobResources]], *, queue: str = "day", jobname: str = "indexing") -> list[int]:
+        job_ids = [0] * len(jobs)
+
+        for pack in pack_jobs([r for _, r in jobs], self.node_cpus):
+            r = jobs[pack[0]][1]
+            if len(pack) == 1:
+                job_id = self._sbatch(jobs[pack[0]][0], queue=queue, jobname=jobname, resources=r)
+            else:
+                packed_script = packed_job_script([jobs[i][0] for i in pack], cpus=r.cpus, mem_gb=r.mem_gb)
+                packed_resources = r.model_copy(update={"mem_gb": r.mem_gb and r.mem_gb * len(pack)})
+                job_id = self._sbatch(packed_script, queue=queue, jobname=jobname, resources=packed_resources, ntasks=len(pack))
+            for i in pack:
+                job_ids[i] = job_id
+
+        return job_ids
+
+    def submit_array(self, script_texts: list[str], *, resources: JobResources, queue: str = "day", jobname: str = "indexing") -> list[int]:
+        array_script = array_job_script(script_texts)
+        job_id = self._sbatch(array_script, queue=queue, jobname=jobname, resources=resources, array=f"0-{len(script_texts) - 1}")
+        # squeue -j <array job id> lists all of its tasks, so one id covers them all
+        return [job_id] * len(script_texts)
+
+    def _sbatch(
+        self,
+        script_text: str,
+        *,
+        queue: str,
+        jobname: str,
+        resources: JobResources,
+        ntasks: int = 1,
+        array: str | None = None,
+    ) -> int:
+        # sbatch copies the script at submission, so a temporary file is enough
+        with tempfile.TemporaryDirectory() as tempdir:
+            script_path = Path(tempdir) / f"{jobname}_sbatch.sh"
+            script_path.write_text(script_text)
+            job_id = utils.submit_job(
+                script_path,
+                queue=queue,
+                jobname=jobname,
+                time=resources.time,
+                cpus=resources.cpus,
+                exclusive=resources.exclusive,
+                mem_gb=resources.mem_gb,
+                ntasks=ntasks,
+                array=array,
+            )
+        return job_id
+
+    def wait(self, job_ids: set[int]) -> None:
+        utils.wait_for_jobs(set(job_ids))
+
+
+class LocalExecutor(Executor):
+    """
+    Runs job scripts with `sh` on this machine, at most `max_cpus` worth at a time.
+
+    Each job is given its requested `resources.cpus`, capped at `cpus_per_job`, or
+    `cpus_per_job` CPUs without a request. `OMP_NUM_THREADS` is set accordingly, which
+    GNU `nproc` honours, so the `$(nproc)` thread counts in our scripts use exactly that share.
+    Output goes to `crystred-local-<pid>-<job_id>-<jobname>.out` in the working directory,
+    like sbatch; the pid keeps job ids, which restart at 1 in every process, from clashing.
+    """
+
+    def __init__(self, *, max_cpus: int | None = None, cpus_per_job: int = 4):
+        self.max_cpus = max_cpus or os.cpu_count() or 1
+        self.cpus_per_job = max(1, min(cpus_per_job, self.max_cpus))
+
+        self._free_cpus = self.max_cpus
+        self._cpu_condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_cpus, thread_name_prefix="crystred-local")
+        self._futures: dict[int, Future] = {}
+        self._job_counter = itertools.count(1)
+        self._script_dir = tempfile.TemporaryDirectory(prefix="crystred-local-")
+
+    def submit(
+        self,
+        script_text: str,
+        *,
+        queue: str = "day",
+        jobname: str = "indexing",
+        time: str = "23:00:00",
+        resources: JobResources | None = None,
+    ) -> int:
+        job_id = next(self._job_counter)
+
+        # unlike sbatch, the script must outlive this call: it runs later, in the pool
+        script_path = Path(self._script_dir.name) / f"{job_id:06d}_{jobname}.sh"
+        script_path.write_text(script_text)
+
+        log_path = Path(f"crystred-local-{os.getpid()}-{job_id}-{jobname}.out").resolve()
+        # Slurm-sized requests assume a whole node; locally cpus_per_job is the ceiling
+        cpus = self.cpus_per_job if resources is None else max(1, min(resources.cpus, self.cpus_per_job))
+        self._futures[job_id] = self._pool.submit(self._run, script_path, log_path, cpus)
+        print(f"Started local job {job_id} ({jobname})")
+
+        return job_id
+
+    def _run(self, script_path: Path, log_path: Path, cpus: int) -> int:
+        with self._cpu_condition:
+            self._cpu_condition.wait_for(lambda: self._free_cpus >= cpus)
+            self._free_cpus -= cpus
+
+        try:
+            env = dict(os.environ, OMP_NUM_THREADS=str(cpus))
+            # inside a Slurm allocation, don't let the allocation's size override our share
+            env.pop("SLURM_CPUS_PER_TASK", None)
+            with log_path.open("w") as log:
+                result = subprocess.run(["sh", str(script_path)], stdout=log, stderr=subprocess.STDOUT, env=env)
+            return result.returncode
+        finally:
+            with self._cpu_condition:
+                self._free_cpus += cpus
+                self._cpu_condition.notify_all()
+
+    def wait(self, job_ids: set[int]) -> None:
+        futures = {self._futures.pop(job_id): job_id for job_id in job_ids if job_id in self._futures}
+        with tqdm(total=len(futures), desc="Jobs Completed", unit="job") as pbar:
+            for future in as_completed(futures):
+                returncode = future.result()
+                if returncode != 0:
+                    print(f" !!!  local job {futures[future]} exited with status {returncode}")
+                pbar.update(1)
+
+    def shutdown(self) -> None:
+        self.wait(set(self._futures))
+        self._pool.shutdown()
+        self._script_dir.cleanup()
+
+
+def packed_job_script(script_texts: list[str], cpus: int, mem_gb: int | None = None) -> str:
+    """
+    Wrap several job scripts into one that runs each as a concurrent `srun` step with
+    `cpus` CPUs and `mem_gb` memory, inside a single `--ntasks=len(script_texts)`
+    allocation. Exits non-zero if any step failed.
+    """
+
+    # a step without a memory request takes all of the job's memory, serializing the rest
+    mem = f" --mem={mem_gb}G" if mem_gb else ""
+
+    lines = [
+        "#!/bin/sh",
+        "",
+        "STEPS=$(mktemp -d)",
+        "trap 'rm -rf \"$STEPS\"' EXIT",
+        "PIDS=",
+        "",
+    ]
+
+    for i, script_text in enumerate(script_texts):
+        lines += _write_script_lines(f"$STEPS/step{i}.sh", script_text) + [
+            f"srun --exact -N1 -n1 -c {cpus}{mem} sh \"$STEPS/step{i}.sh\" > slurm-${{SLURM_JOB_ID}}.{i}.out 2>&1 &",
+            'PIDS="$PIDS $!"',
+            "",
+        ]
+
+    lines += [
+        "STATUS=0",
+        "for PID in $PIDS; do",
+        '    wait "$PID" || STATUS=1',
+        "done",
+        "exit $STATUS",
+    ]
+
+    return "\n".join(lines) + "\n"
+
+
+def array_job_script(script_texts: list[str]) -> str:
+    """Wrap several job scripts into one that runs script `$SLURM_ARRAY_TASK_ID`."""
+
+    lines = [
+        "#!/bin/sh",
+        "",
+        "STEP=$(mktemp)",
+        "trap 'rm -f \"$STEP\"' EXIT",
+        "",
+        'case "$SLURM_ARRAY_TASK_ID" in',
+    ]
+
+    for i, script_text in enumerate(script_texts):
+        lines += [f"{i})"] + _write_script_lines("$STEP", script_text) + [";;"]
+
+    lines += [
+        "*)",
+        'echo "no script for array task $SLURM_ARRAY_TASK_ID" >&2',
+        "exit 1",
+        ";;",
+        "esac",
+        "",
+        'sh "$STEP"',
+    ]
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_script_lines(path: str, script_text: str) -> list[str]:
+    # a quoted heredoc delimiter keeps the script text exactly as written
+    return [
+        f"cat > \"{path}\" <<'CRYSTRED_STEP_EOF'",
+        script_text.rstrip("\n"),
+        "CRYSTRED_STEP_EOF",
+    ]
+
+
+_executors: dict[str, Executor] = {}
+
+
+def get_executor(cfg: config.SwissFELConfig) -> Executor:
+    """
+    Return the executor selected by `cfg.executor`, shared for the whole process so that
+    the local backend's CPU budget covers every job we launch.
+    """
+
+    exc = cfg.executor
+
+    if exc.backend not in _executors:
+        if exc.backend == "slurm":
+            _executors[exc.backend] = SlurmExecutor(node_cpus=cfg.resources.node_cpus)
+        elif exc.backend == "local":
+            _executors[exc.backend] = LocalExecutor(max_cpus=exc.max_cpus, cpus_per_job=exc.cpus_per_job)
+        else:
+            raise ValueError(f"unknown executor backend: {exc.backend}")
+
+    return _executors[exc.backend]
@@ -1,17 +1,20 @@
-import pandas as pd
 import os
-from glob import glob
-import regex as re
-import numpy as np
-import matplotlib.pyplot as plt
+import re
 from pathlib import Path
 
-from . import utils
 from . import config
+from . import executors
 from . import index
+from . import resources
+from . import streamio
+
+
+# pandas, numpy and matplotlib are imported inside the functions that use them: every
+# command imports this module, and most never touch them (see manual-tests/bench_startup.py)
 
 
 def geometry_file_for_run(run_number: int, cfg: config.SwissFELConfig) -> Path:
+    import pandas as pd
 
     geometry_summary = pd.read_csv(cfg.geometry_summary_path)
     optimized_base_path = cfg.geometry_optimization_directory
@@ -29,7 +32,27 @@ def geometry_file_for_run(run_number: int, cfg: config.SwissFELConfig) -> Path:
     return geometry_file_path
 
 
+def update_geometry_summary(cfg: config.SwissFELConfig, run_number: int, geometry_run: int) -> None:
+    # record that `run_number` uses the optimized geometry of `geometry_run`
+    import pandas as pd
+
+    if cfg.geometry_summary_path.exists():
+        geometry_summary = pd.read_csv(cfg.geometry_summary_path)
+    else:
+        geometry_summary = pd.DataFrame(columns=["run_number", "geometry_run"])
+
+    geometry_summary = geometry_summary[geometry_summary["run_number"] != run_number]
+    row = pd.DataFrame([{"run_number": run_number, "geometry_run": geometry_run}])
+    geometry_summary = pd.concat([geometry_summary, row], ignore_index=True).sort_values("run_number")
+
+    tmp_path = cfg.geometry_summary_path.with_name(cfg.geometry_summary_path.name + ".partial")
+    geometry_summary.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, cfg.geometry_summary_path)
+
+
 def subsample_lst_file(lst_file_path: Path, sample_size: int) -> Path:
+    import pandas as pd
+
     # create sample of images from run
     # read h5.lst - note - removes // from image column
     cols = ["h5", "image"]
@@ -73,13 +96,20 @@ def scan_for_optimal_geometry(
     cfg: config.SwissFELConfig,
     clens_to_scan: list[float],
     subsample_size: int = 5000,
+    executor: executors.Executor | None = None,
 ):
     working_dir = Path(working_dir)
 
+    if executor is None:
+        executor = executors.get_executor(cfg)
+
     # make sample list
     sample_list_file = subsample_lst_file(list_file, subsample_size)
 
-    submitted_job_ids = set()
+    # every clen point indexes the same sample, so they are all sized alike and can
+    # share nodes as concurrent job steps
+    sample_resources = resources.estimate_indexing_resources(sample_list_file, cfg)
+    jobs = []
 
     print("begin CrystFEL analysis of different clens")
 
@@ -90,16 +120,18 @@ def scan_for_optimal_geometry(
         proc_dir.mkdir(parents=True, exist_ok=True)
 
         clen_geom_file = change_geometry_clen(initial_geom_file, clen, proc_dir)
-        job_id = index.launch_indexing_job(
+        script_text = index.indexing_script(
             list_file=sample_list_file,
             geometry_file=clen_geom_file,
             output_stream_path=proc_dir / f"{clen:.5f}.stream",
             config=cfg,
+            stage_to_scratch=cfg.executor.stage_to_scratch,
         )
-        submitted_job_ids.add(job_id)
+        jobs.append((script_text, sample_resources))
 
-    utils.wait_for_jobs(submitted_job_ids)
-    print("slurm processing done")
+    submitted_job_ids = set(executor.submit_packed(jobs, jobname="clen-scan"))
+    executor.wait(submitted_job_ids)
+    print("indexing jobs done")
 
 
 # -----------------------------------------------------------------------------
@@ -114,6 +146,8 @@ def scrub_clen(stream_path: str) -> float:
 
 
 def stream_to_unitcell_dataframe(stream_file_path, max_num_cells=None):
+    import pandas as pd
+
     pattern = re.compile(
         r"Cell\sparameters\s(\d+\.\d+)\s(\d+\.\d+)\s(\d+\.\d+)\snm,\s"
         r"(\d+\.\d+)\s(\d+\.\d+)\s(\d+\.\d+)\sdeg"
@@ -121,7 +155,7 @@ def stream_to_unitcell_dataframe(stream_file_path, max_num_cells=None):
 
     data = []
 
-    with open(stream_file_path, "r") as stream_f:
+    with streamio.open_stream(stream_file_path, "r") as stream_f:
         for line in stream_f:
             match = pattern.search(line)
             if match:
@@ -135,6 +169,7 @@ def stream_to_unitcell_dataframe(stream_file_path, max_num_cells=None):
 
 
 def determine_statistic_minimum(cell_dataframe, statistic_name, polyfit_degree=2, r2tol=0.1):
+    import numpy as np
 
     x = cell_dataframe['clen'].values
     y = cell_dataframe[statistic_name].values
@@ -167,6 +202,8 @@ def determine_clen_from_scan(scan_top_dir, plot=False, stat_to_optimize="std_c")
     suggested_clen = determine_statistic_minimum(stats_df, stat_to_optimize)
 
     if plot:
+        import matplotlib.pyplot as plt
+
         fig, (ax1, ax3) = plt.subplots(1, 2)
         ax2 = ax1.twinx()
         ax4 = ax3.twinx()
@@ -183,29 +220,21 @@ def determine_clen_from_scan(scan_top_dir, plot=False, stat_to_optimize="std_c")
 
 
 def compute_unitcell_statistics_as_function_of_clen(scan_top_dir):
+    import pandas as pd
+
+    from . import cellstats
 
     stats: list[dict] = []
 
-    glob_pattern = os.path.join(scan_top_dir, "*/*.stream")
-    for stream_file_path in glob(glob_pattern):
+    # clen directories only, not e.g. the reuse probe kept next to them
+    glob_pattern = os.path.join(scan_top_dir, "[0-9]*/*.stream")
+    for stream_file_path in streamio.glob_streams(glob_pattern):
 
         clen = scrub_clen(stream_file_path)
-        cells_df = stream_to_unitcell_dataframe(stream_file_path)
-        print(f"analyzing clen = {clen} / {len(cells_df)} indexed")
-
-        stats.append({
-            "clen": clen,
-            "indexed": len(cells_df),
-            "std_a": cells_df.a.std(),
-            "std_b": cells_df.b.std(),
-            "std_c": cells_df.c.std(),
-            "std_alpha": cells_df.alpha.std(),
-            "std_beta": cells_df.beta.std(),
-            "std_gamma": cells_df.gamma.std(),
-            "skew_a": cells_df.a.skew(),
-            "skew_b": cells_df.b.skew(),
-            "skew_c": cells_df.c.skew(),
-        })
+        cell_stats = cellstats.stream_to_unitcell_statistics(stream_file_path)
+        print(f"analyzing clen = {clen} / {cell_stats.count} indexed")
+
+        stats.append({"clen": clen, **cell_stats.summary()})
 
     stats_df = pd.DataFrame(stats)
 
@@ -259,7 +288,7 @@ def detector_shift(initial_geometry_path: Path, stream_file_paths: list[Path]) -
     prog_det = re.compile(r"^predict_refine/det_shift\sx\s=\s([0-9.\-]+)\sy\s=\s([0-9.\-]+)\smm$")
 
     for file in stream_file_paths:
-        with open(file, 'r') as f:
+        with streamio.open_stream(file, 'r') as f:
             for fline in f:
                 match = prog_det.match(fline)
                 if match:
@@ -1,28 +1,44 @@
-
-import os
-import tempfile
 from pathlib import Path
 
-from . import utils
 from . import config
+from . import executors
+from . import resources as job_resources
+from . import staging
 
 
-def launch_indexing_job(*, list_file: Path, geometry_file: Path, output_stream_path: Path, config: config.SwissFELConfig) -> int:
+def indexing_script(
+    *,
+    list_file: Path,
+    geometry_file: Path,
+    output_stream_path: Path,
+    config: config.SwissFELConfig,
+    stage_to_scratch: bool = False,
+) -> str:
 
-    with tempfile.TemporaryDirectory() as tempdir:
-        script_path = os.path.join(tempdir, "indexing_sbatch.sh")
+    # when staging, indexamajig writes its stream and temporary files to node-local
+    # scratch and the stream is copied back in one piece at the end
+    if stage_to_scratch:
+        preamble = "\n" + staging.scratch_preamble(config)
+        stream_path = f"$SCRATCH/{Path(output_stream_path).name}"
+        temp_dir_option = "--temp-dir=$SCRATCH "
+        epilogue = staging.stage_out(stream_path, output_stream_path) + "\n"
+    else:
+        preamble = ""
+        stream_path = output_stream_path
+        temp_dir_option = ""
+        epilogue = ""
 
-        idx = config.indexing
-        script_content = f"""#!/bin/sh
+    idx = config.indexing
+    script_content = f"""#!/bin/sh
 
 module purge
 module load crystfel/{config.crystfel_version}
-
+{preamble}
 indexamajig -i {list_file} \\
-  --output={output_stream_path} \\
+  --output={stream_path} {temp_dir_option}\\
   --geometry={geometry_file} \\
   --pdb={config.cell_file_path} \\
-  -j $(nproc) \\
+  -j ${{SLURM_CPUS_PER_TASK:-$(nproc)}} \\
   --peaks={idx.peak_finding_method} \\
   --threshold={idx.peak_threshold} \\
   --min-snr={idx.min_snr} \\
@@ -34,11 +50,39 @@ indexamajig -i {list_file} \\
   --integration={idx.integration_method} \\
   --local-bg-radius={idx.local_bg_radius} \\
   --multi --retry --check-peaks
-"""
+{epilogue}"""
+
+    return script_content
+
+
+def launch_indexing_job(
+    *,
+    list_file: Path,
+    geometry_file: Path,
+    output_stream_path: Path,
+    config: config.SwissFELConfig,
+    executor: executors.Executor | None = None,
+    resources: job_resources.JobResources | None = None,
+    stage_to_scratch: bool | None = None,
+) -> int:
+
+    if executor is None:
+        executor = executors.get_executor(config)
+
+    if resources is None:
+        resources = job_resources.estimate_indexing_resources(list_file, config)
+
+    if stage_to_scratch is None:
+        stage_to_scratch = config.executor.stage_to_scratch
 
-        with open(script_path, "w") as f:
-            f.write(script_content)
+    script_content = indexing_script(
+        list_file=list_file,
+        geometry_file=geometry_file,
+        output_stream_path=output_stream_path,
+        config=config,
+        stage_to_scratch=stage_to_scratch,
+    )
 
-        job_id = utils.submit_job(script_path)
+    job_id = executor.submit(script_content, resources=resources)
 
     return job_id
@@ -0,0 +1,81 @@
+import math
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from . import config
+
+
+class JobResources(BaseModel):
+    # the defaults reproduce the old fixed request: one whole node for 23 hours
+    cpus: int = 36
+    mem_gb: int | None = None
+    time: str = "23:00:00"
+    exclusive: bool = True
+
+
+def count_events(list_file: Path) -> int:
+    # one event per non-empty line, i.e. "<file> //<event>"
+    with open(list_file, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def format_slurm_time(hours: float) -> str:
+    total_minutes = max(1, math.ceil(hours * 60))
+    days, minutes = divmod(total_minutes, 24 * 60)
+    hh, mm = divmod(minutes, 60)
+    if days:
+        return f"{days}-{hh:02d}:{mm:02d}:00"
+    return f"{hh:02d}:{mm:02d}:00"
+
+
+def estimate_indexing_resources(list_file: Path, cfg: config.SwissFELConfig) -> JobResources:
+    """
+    Size an indexamajig job from the number of events in its list file.
+
+    We ask for the fewest CPUs that finish the work in about `target_hours`, and only take
+    the node exclusively once the job needs all of it. The wall time is the expected run
+    time scaled by `time_safety_factor`, clamped to [`min_minutes`, `max_hours`].
+    """
+
+    res = cfg.resources
+
+    n_events = count_events(list_file)
+    cpu_hours = n_events / res.images_per_cpu_hour
+
+    cpus = math.ceil(cpu_hours / res.target_hours)
+    cpus = min(max(cpus, res.min_cpus), res.node_cpus)
+
+    hours = cpu_hours / cpus * res.time_safety_factor
+    hours = min(max(hours, res.min_minutes / 60), res.max_hours)
+
+    exclusive = cpus >= res.node_cpus
+
+    return JobResources(
+        cpus=cpus,
+        mem_gb=None if exclusive else math.ceil(cpus * res.mem_gb_per_cpu),
+        time=format_slurm_time(hours),
+        exclusive=exclusive,
+    )
+
+
+def pack_jobs(job_resources: list[JobResources], node_cpus: int) -> list[list[int]]:
+    """
+    Group jobs (by index) so that each group fits on one node as concurrent job steps.
+
+    Only jobs with identical resource requests share a node, which keeps the packed
+    allocation homogeneous (`--ntasks=N --cpus-per-task=C`). Exclusive jobs stay alone.
+    """
+
+    by_request: dict[str, list[int]] = {}
+    for i, r in enumerate(job_resources):
+        by_request.setdefault(r.model_dump_json(), []).append(i)
+
+    packs: list[list[int]] = []
+    for indices in by_request.values():
+        r = job_resources[indices[0]]
+        per_node = 1 if r.exclusive else max(1, node_cpus // r.cpus)
+        for start in range(0, len(indices), per_node):
+            packs.append(indices[start:start + per_node])
+
+    return packs
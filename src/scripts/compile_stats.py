@@ -3,13 +3,17 @@
 import argparse
 from glob import glob
 from pathlib import Path
-
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from .. import config
+from .. import streamio
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def load_stats_by_shell(stats_directory: str, tag: str) -> pd.DataFrame:
+def load_stats_by_shell(stats_directory: str, tag: str) -> "pd.DataFrame":
+    import pandas as pd
 
     check_stats_file = Path(stats_directory) / Path(f"{tag}_check.dat")
     rsplit_file      = Path(stats_directory) / Path(f"{tag}_rsplit.dat")
@@ -36,7 +40,7 @@ def load_stats_by_shell(stats_directory: str, tag: str) -> pd.DataFrame:
 
 
 def count_number_of_crystals_merged(stream_file: Path) -> int:
-    with stream_file.open("r") as f:
+    with streamio.open_stream(stream_file, "r") as f:
         count = sum(1 for line in f if line.startswith("Cell"))
     return count
 
@@ -58,7 +62,9 @@ def main():
             if (stats_path / f"{tag}_check.dat").exists():
 
                 laser_state = tag.split("_")[-1]
-                n_indexed = count_number_of_crystals_merged(Path(dataset) / f"{basename}_combined_{laser_state}.stream")
+                n_indexed = count_number_of_crystals_merged(
+                    streamio.resolve_stream_path(Path(dataset) / f"{basename}_combined_{laser_state}.stream")
+                )
 
                 df = load_stats_by_shell(stats_path, tag)
                 df.to_csv(stats_output_dir / f"{tag}_stats_by_shell.csv", index=False)
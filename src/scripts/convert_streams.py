@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+from .. import streamio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress stream files into block-indexed .stream.zst/.stream.gz, or decompress them.")
+    parser.add_argument("streams", type=Path, nargs="+", help="Stream files to convert.")
+    parser.add_argument("--codec", choices=sorted(streamio.CODEC_SUFFIXES), default="zstd", help="Compression codec.")
+    parser.add_argument("--chunks-per-block", type=int, default=256, help="Chunks per independently compressed block.")
+    parser.add_argument("--level", type=int, default=None, help="Compression level (codec default if omitted).")
+    parser.add_argument("--remove", action="store_true", help="Delete each source file after a successful conversion.")
+    parser.add_argument("-d", "--decompress", action="store_true", help="Decompress instead of compressing.")
+    parser.add_argument("--stdout", action="store_true", help="With -d, write the plain stream(s) to stdout, e.g. into a pipe.")
+    args = parser.parse_args()
+
+    if args.stdout and not args.decompress:
+        parser.error("--stdout only works with -d")
+    if args.stdout and args.remove:
+        parser.error("--remove cannot be used with --stdout")
+
+    for stream in args.streams:
+
+        if args.decompress:
+            if args.stdout:
+                streamio.decompress_stream(stream, sys.stdout.buffer)
+                continue
+            codec = streamio.codec_for_path(stream)
+            if codec is None:
+                raise ValueError(f"{stream} is not a compressed stream")
+            output = Path(str(stream).removesuffix(streamio.CODEC_SUFFIXES[codec]))
+            with output.open("wb") as f:
+                streamio.decompress_stream(stream, f)
+            if args.remove:
+                os.remove(stream)
+                streamio.index_path(stream).unlink(missing_ok=True)
+
+        else:
+            output = streamio.compress_stream(
+                stream,
+                codec=args.codec,
+                chunks_per_block=args.chunks_per_block,
+                level=args.level,
+            )
+            before, after = stream.stat().st_size, output.stat().st_size
+            print(f"{stream} -> {output}  ({before / max(after, 1):.1f}x smaller)", file=sys.stderr)
+            if args.remove:
+                os.remove(stream)
+
+
+if __name__ == "__main__":
+    main()
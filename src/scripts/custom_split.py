@@ -1,58 +1,41 @@
 #!/usr/bin/env python
 
-import re
 import argparse
-import subprocess
-import tempfile
-from glob import glob
 from pathlib import Path
 
 from .. import config
+from .. import executors
+from .. import streamio
 
 
 def find_event_integers(filename: str) -> list[int]:
-    pattern = r'Event: //[-+]?\d+'
-    matches = []
+    from .. import catalog
 
-    with open(filename, 'r') as file:
-        for _, line in enumerate(file, 1):
-            for match in re.findall(pattern, line):
-                number_str = match.split('//')[1]
-                try:
-                    number = int(number_str)
-                    matches.append(number)
-                except ValueError:
-                    continue
-
-    return matches
+    # images whose event id is not an integer, or that have none, are skipped
+    return catalog.EventCatalog.from_streams([filename]).integer_events().tolist()
 
 
 def glob_streams(tag: str, cfg: config.SwissFELConfig, which: str) -> list[str]:
     pattern = f"/sf/{cfg.beamline}/data/{cfg.experiment_id}/res/run*-{tag}/index/{which}/acq*.stream"
-    return glob(pattern)
+    return streamio.glob_streams(pattern)
 
 
 def make_list(tag: str, cfg: config.SwissFELConfig):
+    from .. import catalog
 
-    with open("./custom-split.lst", "w") as f:
-        for which in ["dark", "light"]:
-            i = 0
-
-            for stream in glob_streams(tag, cfg, which):
-                stream = str(Path(stream).resolve())
-                pattern = r'Image filename:\s*(\S+)\s*Event:\s*(\S+)'
-
-                with open(stream, "r") as stream_f:
-                    matches = re.findall(pattern, stream_f.read())
+    # cached next to the list, rebuilt only when the streams behind it change
+    events = catalog.load_or_build_from_streams(
+        Path(f"./event-catalog-{tag}"),
+        {which: [Path(stream).resolve() for stream in glob_streams(tag, cfg, which)] for which in ["dark", "light"]},
+    )
 
-                for image_filename, event in matches:
-                    f.write(f"{image_filename} {event} {which}\n")
-                    i += 1
+    for which in ["dark", "light"]:
+        print(which, len(events.select(which)))
 
-            print(which, i)
+    events.write_custom_split(Path("./custom-split.lst"))
 
 
-def submit_partialator_job(tag: str, cfg: config.SwissFELConfig):
+def submit_partialator_job(tag: str, cfg: config.SwissFELConfig, executor: executors.Executor | None = None) -> int:
 
     pattern = f"/sf/{cfg.beamline}/data/{cfg.experiment_id}/res/run*-{tag}/index/*/acq*.stream"
     mrg = cfg.merging
@@ -72,17 +55,13 @@ partialator -j $(nproc) -i {pattern} --custom-split=custom-split.lst \\
   --max-adu={mrg.max_adu} > partialator_{tag}.log 2>&1
 """
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".sh", delete=False) as f:
-        f.write(script_text)
-        filename = f.name
+    if executor is None:
+        executor = executors.get_executor(cfg)
 
-    try:
-        result = subprocess.run(["sbatch", filename], check=True, capture_output=True, text=True)
-        print("Submission output:")
-        print(result.stdout)
-    except subprocess.CalledProcessError as e:
-        print("Failed to submit job:")
-        print(e.stderr)
+    job_id = executor.submit(script_text, queue="week", jobname="crystfel", time="3-00:00:00")
+    print(f"Submitted partialator job {job_id}")
+
+    return job_id
 
 
 def main():
@@ -96,6 +75,8 @@ def main():
     make_list(args.tag, cfg)
     submit_partialator_job(args.tag, cfg)
 
+    executors.get_executor(cfg).shutdown()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import argparse
+from pathlib import Path
+
+from .. import config, streamio, subset
+
+
+def input_streams_for_runs(run_range: tuple[int, int], laser_state: str, cfg: config.SwissFELConfig) -> list[Path]:
+    paths = []
+    for run in range(run_range[0], run_range[1] + 1):
+        path = streamio.resolve_stream_path(cfg.stream_file_directory / f"run{run:04d}" / f"run{run:04d}-{laser_state}.stream")
+        if path.exists():
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a new stream with only the crystals passing the given filters, "
+                    "ready for `merge-runset --streams`."
+    )
+    parser.add_argument("output", type=Path, help="Filtered stream to write.")
+    parser.add_argument("streams", type=Path, nargs="*", help="Input streams (plain or compressed).")
+    parser.add_argument("--config", type=Path, help="Take the input streams of --runs/--laser-state from this project config.")
+    parser.add_argument("--laser-state", default="all", help="Laser state of the input streams, with --config.")
+    parser.add_argument("--runs", type=int, nargs=2, metavar=("FIRST", "LAST"), help="Keep only runs FIRST..LAST (inclusive).")
+    parser.add_argument("--indexed-by", action="append", metavar="METHOD", help="Keep only crystals indexed by a method containing METHOD.")
+    parser.add_argument("--exclude-events", type=Path, metavar="LST", help="Drop the events listed in this .lst-style file.")
+    parser.add_argument("--cell", nargs=3, action="append", metavar=("PARAM", "MIN", "MAX"), default=[],
+                        help=f"Keep crystals with cell parameter PARAM ({', '.join(subset.CELL_PARAMETERS)}) in [MIN, MAX].")
+    parser.add_argument("--cell-sigma", type=float, help="Drop cell-parameter outliers beyond this many robust sigmas of the median.")
+    args = parser.parse_args()
+
+    inputs = list(args.streams)
+    if args.config is not None:
+        if args.runs is None:
+            parser.error("--config needs --runs")
+        cfg = config.SwissFELConfig.from_yaml(args.config)
+        inputs += input_streams_for_runs(tuple(args.runs), args.laser_state, cfg)
+    if not inputs:
+        parser.error("no input streams")
+
+    cell_ranges = {}
+    for name, low, high in args.cell:
+        if name not in subset.CELL_PARAMETERS:
+            parser.error(f"unknown cell parameter: {name}")
+        cell_ranges[name] = (float(low), float(high))
+
+    crystal_filter = subset.CrystalFilter(
+        run_range=tuple(args.runs) if args.runs else None,
+        indexing_methods=args.indexed_by,
+        exclude_events=subset.read_event_list(args.exclude_events) if args.exclude_events else None,
+        cell_ranges=cell_ranges,
+        cell_sigma=args.cell_sigma,
+    )
+
+    n_crystals = subset.filter_streams(inputs, args.output, crystal_filter)
+    print(f"Wrote {n_crystals} crystals from {len(inputs)} stream(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 #!/usr/bin/env python
 
 import argparse
-import pandas as pd
 from pathlib import Path
 
-from .. import config, geometry, index
+from .. import config, executors, geometry, index
 
 
 def index_run(run_number: int, cfg: config.SwissFELConfig):
@@ -38,11 +37,14 @@ def main():
 
     cfg = config.SwissFELConfig.from_yaml(args.config)
 
+    import pandas as pd
     geometry_summary = pd.read_csv(cfg.geometry_summary_path)
     runs = list(geometry_summary["run_number"])
     for run_number in runs:
         index_run(run_number, cfg)
 
+    executors.get_executor(cfg).shutdown()
+
 
 if __name__ == "__main__":
     main()
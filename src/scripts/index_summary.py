@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+import argparse
+from pathlib import Path
+
+from .. import config, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the indexing of every run, updating the cached table.")
+    parser.add_argument("config", type=Path, help="Path to the YAML config file.")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="Streams read in parallel (default: all CPUs).")
+    parser.add_argument("--force", action="store_true", help="Re-read every stream, ignoring the cached table.")
+    args = parser.parse_args()
+
+    cfg = config.SwissFELConfig.from_yaml(args.config)
+
+    table = summary.update_index_summary(cfg, processes=args.processes, force=args.force)
+
+    if table.empty:
+        print(f"no run streams under {cfg.stream_file_directory} yet")
+    else:
+        columns = ["run_number", "laser_state", "images", "hits", "indexed", "indexing_rate"]
+        print(table[columns].to_string(index=False))
+    print(f"\nfull table: {summary.index_summary_path(cfg)}")
+
+
+if __name__ == "__main__":
+    main()
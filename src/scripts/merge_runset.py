@@ -1,46 +1,94 @@
 #!/usr/bin/env python
 
-import os
 import argparse
-import tempfile
-from glob import glob
 from pathlib import Path
 from typing import Literal
 
-from .. import utils
 from .. import config
+from .. import executors
+from .. import staging
+from .. import streamio
 
 
 def launch_merge_job(
         *,
         name: str,
-        runs: list[int],
+        runs: list[int] | None = None,
         laser_state: Literal["light", "dark"],
         cfg: config.SwissFELConfig,
         queue: str = "week",
+        executor: executors.Executor | None = None,
+        stage_to_scratch: bool | None = None,
+        stream_paths: list[Path] | None = None,
     ):
+    """
+    Merge the streams of `runs`, or exactly the streams in `stream_paths` if given
+    (e.g. the output of `crystred filter`).
+    """
 
     if laser_state not in cfg.allowed_laser_states:
         raise ValueError(f"`laser_state` can only be {cfg.allowed_laser_states}")
 
     mrg = cfg.merging
 
-    if mrg.use_online_streams:
-        list_of_stream_paths: list[Path] = []
+    if stage_to_scratch is None:
+        stage_to_scratch = cfg.executor.stage_to_scratch
+
+    if runs is None and stream_paths is None:
+        raise ValueError("give either `runs` or `stream_paths`")
+
+    if stream_paths is not None:
+        # the job script runs in the merge directory, not here
+        list_of_stream_paths = [Path(p).resolve() for p in stream_paths]
+    elif mrg.use_online_streams:
+        list_of_stream_paths = []
         for run in runs:
             pattern = f"/sf/{cfg.beamline}/data/{cfg.experiment_id}/res/run{run:04d}-*/index/{laser_state}/acq*.stream"
-            list_of_stream_paths.extend(Path(p) for p in glob(pattern))
+            list_of_stream_paths.extend(Path(p) for p in streamio.glob_streams(pattern))
     else:
         list_of_stream_paths = [
-            cfg.stream_file_directory / f"run{run:04d}" / f"run{run:04d}-{laser_state}.stream"
+            streamio.resolve_stream_path(cfg.stream_file_directory / f"run{run:04d}" / f"run{run:04d}-{laser_state}.stream")
             for run in runs
         ]
 
     print(f"Wanted: {len(list_of_stream_paths)}")
     print(f"Found: {sum(p.exists() for p in list_of_stream_paths)} on disk")
 
-    stream_paths_str = " ".join(str(p) for p in list_of_stream_paths)
-    combine_stream_command = f"cat {stream_paths_str} > {name}_combined_{laser_state}.stream"
+    # merge whatever is there; the job never sees the missing streams, so a staged
+    # merge (`set -e`) does not abort on them where an unstaged one would carry on
+    for p in list_of_stream_paths:
+        if not p.exists():
+            print(f" !!!  {p} not found, merging without it")
+    list_of_stream_paths = [p for p in list_of_stream_paths if p.exists()]
+    if not list_of_stream_paths:
+        raise ValueError(f"no streams to merge for {name} ({laser_state})")
+
+    combine_stream_command = streamio.cat_command(list_of_stream_paths, f"{name}_combined_{laser_state}.stream")
+
+    tag = f"{name}_{laser_state}"
+    stats_files = [f"{tag}_check.dat", f"{tag}_rsplit.dat", f"{tag}_ccstar.dat", f"{tag}_cc.dat"]
+
+    # when staging, everything between the `cat` and `get_hkl` happens in node-local
+    # scratch; results reach $WD (and the mtz directory) only once all steps succeeded
+    if stage_to_scratch:
+        outputs = [
+            f"{name}_combined_{laser_state}.stream",
+            f"{tag}.hkl", f"{tag}.hkl1", f"{tag}.hkl2",
+            "partialator.log",
+            f"{tag}.mtz",
+        ] + [f"stats/{f}" for f in stats_files]
+
+        enter_scratch = "\n" + staging.scratch_preamble(cfg) + 'cd "$SCRATCH"\n'
+        leave_scratch = "\n".join(
+            ['mkdir -p "$WD/stats" "$WD/pr-logs"']
+            + [staging.stage_out(f, f"$WD/{f}") for f in outputs]
+            # partialator's refinement logs, kept in $WD as an unstaged merge keeps them
+            + ['for f in pr-logs/*; do', '    [ -f "$f" ] || continue', "    " + staging.stage_out("$f", "$WD/$f"), "done"]
+            + [staging.stage_out(f"{tag}.mtz", cfg.mtz_directory / f"{tag}.mtz")]
+        )
+    else:
+        enter_scratch = ""
+        leave_scratch = f"cp {tag}.mtz {cfg.mtz_directory}"
 
     sbatch_script_text = f"""#!/bin/sh
 
@@ -51,7 +99,7 @@ WD={cfg.merging_directory}/{name}
 echo $WD
 mkdir -p $WD
 cd $WD
-
+{enter_scratch}
 {combine_stream_command}
 
 partialator -j $(nproc) -i {name}_combined_{laser_state}.stream -o {name}_{laser_state}.hkl \\
@@ -69,21 +117,18 @@ compare_hkl {name}_{laser_state}.hkl1 {name}_{laser_state}.hkl2 -y {mrg.symmetry
   --highres={cfg.stats.stats_highres} --fom=cc --shell-file={name}_{laser_state}_cc.dat
 
 mkdir stats
-mv {name}_{laser_state}_check.dat {name}_{laser_state}_rsplit.dat {name}_{laser_state}_ccstar.dat {name}_{laser_state}_cc.dat stats/
+mv {" ".join(stats_files)} stats/
 
 get_hkl -i {name}_{laser_state}.hkl -y {mrg.symmetry} -p {cfg.cell_file_path} \\
   --output-format=mtz --highres={cfg.stats.stats_highres} -o {name}_{laser_state}.mtz
 
-cp {name}_{laser_state}.mtz {cfg.mtz_directory}
+{leave_scratch}
 """
 
-    with tempfile.TemporaryDirectory() as tempdir:
-        cryst_run_file = os.path.join(tempdir, "merging_sbatch.sh")
-
-        with open(cryst_run_file, "w") as run_sh:
-            run_sh.write(sbatch_script_text)
+    if executor is None:
+        executor = executors.get_executor(cfg)
 
-        job_id = utils.submit_job(cryst_run_file, queue=queue, jobname="merging")
+    job_id = executor.submit(sbatch_script_text, queue=queue, jobname="merging")
 
     return job_id
 
@@ -93,18 +138,33 @@ def main():
     parser = argparse.ArgumentParser(description="Merge a set of runs with partialator.")
     parser.add_argument("config", type=Path, help="Path to the YAML config file.")
     parser.add_argument("name", help="Dataset name used for output files.")
-    parser.add_argument("runs", type=int, nargs="+", help="Run numbers to merge.")
+    parser.add_argument("runs", type=int, nargs="*", help="Run numbers to merge.")
+    parser.add_argument("--streams", type=Path, nargs="+", help="Merge these stream files instead of runs, e.g. from `crystred filter`.")
+    parser.add_argument("--laser-state", choices=["dark", "light"], help="Only merge this laser state (required with --streams).")
     args = parser.parse_args()
 
+    if bool(args.runs) == bool(args.streams):
+        parser.error("give either run numbers or --streams")
+    if args.streams and not args.laser_state:
+        parser.error("--streams needs --laser-state")
+
     cfg = config.SwissFELConfig.from_yaml(args.config)
 
-    for laser_state in ["dark", "light"]:
-        launch_merge_job(
-            name=args.name,
-            runs=args.runs,
-            laser_state=laser_state,
-            cfg=cfg,
-        )
+    laser_states = [args.laser_state] if args.laser_state else ["dark", "light"]
+    for laser_state in laser_states:
+        try:
+            launch_merge_job(
+                name=args.name,
+                runs=args.runs,
+                laser_state=laser_state,
+                cfg=cfg,
+                stream_paths=args.streams,
+            )
+        except ValueError as e:
+            print(f" !!!  Error merging {args.name} ({laser_state})... proceeding")
+            print(e)
+
+    executors.get_executor(cfg).shutdown()
 
 
 if __name__ == "__main__":
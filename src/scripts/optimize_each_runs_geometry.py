@@ -1,18 +1,14 @@
 #!/usr/bin/env python
 
 import argparse
+import json
 import shutil
-import numpy as np
 from pathlib import Path
 
-from .. import config, geometry
+from .. import config, executors, geometry, index, streamio, subset
 
 
-def optimize_run_geometry(run_number: int, cfg: config.SwissFELConfig):
-
-    geo = cfg.geometry_optimization
-    working_dir = cfg.geometry_optimization_directory / f"run{run_number:04d}"
-    working_dir.mkdir(exist_ok=True)
+def combined_dark_list(run_number: int, working_dir: Path, cfg: config.SwissFELConfig) -> Path:
 
     combined_list_path = working_dir / f"run{run_number:04d}_all_dark.lst"
 
@@ -21,6 +17,20 @@ def optimize_run_geometry(run_number: int, cfg: config.SwissFELConfig):
             for lst_file in config.get_list_files_for_run(run_number=run_number, config=cfg, laser_state="dark"):
                 outfile.write(lst_file.read_text())
 
+    return combined_list_path
+
+
+def optimize_run_geometry(run_number: int, cfg: config.SwissFELConfig) -> bool:
+    import numpy as np
+
+    from .. import cellstats
+
+    geo = cfg.geometry_optimization
+    working_dir = cfg.geometry_optimization_directory / f"run{run_number:04d}"
+    working_dir.mkdir(exist_ok=True)
+
+    combined_list_path = combined_dark_list(run_number, working_dir, cfg)
+
     clens_to_scan = np.arange(-geo.clen_half_range, geo.clen_half_range) * geo.step_size + geo.clen_center
 
     try:
@@ -38,7 +48,7 @@ def optimize_run_geometry(run_number: int, cfg: config.SwissFELConfig):
         # apply x/y detector shift at the optimal clen
         clen_dir = working_dir / f"{optimal_clen:.5f}"
         clen_optimized_geometry_file = clen_dir / f"{optimal_clen:.5f}.geom"
-        clen_optimized_stream = clen_dir / f"{optimal_clen:.5f}.stream"
+        clen_optimized_stream = streamio.resolve_stream_path(clen_dir / f"{optimal_clen:.5f}.stream")
         geometry.detector_shift(clen_optimized_geometry_file, [clen_optimized_stream])
 
         anticipated_optimal_geom_file = clen_dir / f"{optimal_clen:.5f}-predrefine.geom"
@@ -47,21 +57,136 @@ def optimize_run_geometry(run_number: int, cfg: config.SwissFELConfig):
         if anticipated_optimal_geom_file.exists():
             shutil.copy(anticipated_optimal_geom_file, nicely_named_final_geometry)
 
+            # keep the cell statistics at the optimum, for deciding whether later runs can reuse it
+            cellstats.stream_to_unitcell_statistics(clen_optimized_stream).save(working_dir / "cell_stats.json")
+            geometry.update_geometry_summary(cfg, run_number, run_number)
+            return True
+
     except Exception as e:
         print(f" !!!  Error with run {run_number}... proceeding")
         print(e)
         print("")
 
+    return False
+
+
+def compare_to_reference(probe: subset.StreamIndex, reference_stats_path: Path, geo: config.GeometryOptimizationConfig) -> dict:
+    """
+    Compare the crystals of a probe stream indexed with a reference geometry to the
+    reference run's cell statistics. The geometry is reusable when the mean a, b, c and
+    their spread match within tolerance and predict_refine finds no detector shift.
+    """
+    from .. import cellstats
+
+    reference = cellstats.UnitCellAccumulator.load(reference_stats_path)
+
+    probe_cells = cellstats.accumulate_index(probe)
+    det_shifts = [crystal.det_shift for crystal in probe.crystals() if crystal.det_shift is not None]
+
+    result = {"crystals": probe_cells.count, "checks": {}}
+    if probe_cells.count < geo.reuse_min_crystals or not det_shifts:
+        result["reusable"] = False
+        return result
+
+    checks = result["checks"]
+    for p in ("a", "b", "c"):
+        ref, new = reference.moments[p], probe_cells.moments[p]
+        checks[f"mean_{p}"] = abs(new.mean - ref.mean) / ref.mean <= geo.reuse_cell_tolerance
+        checks[f"std_{p}"] = new.std <= ref.std * (1 + geo.reuse_spread_tolerance)
+
+    mean_dx = sum(dx for dx, _ in det_shifts) / len(det_shifts)
+    mean_dy = sum(dy for _, dy in det_shifts) / len(det_shifts)
+    result["det_shift"] = [mean_dx, mean_dy]
+    checks["det_shift"] = max(abs(mean_dx), abs(mean_dy)) <= geo.reuse_det_shift_tolerance
+
+    result["reusable"] = all(checks.values())
+    return result
+
+
+def nearest_reference_run(run_number: int, cfg: config.SwissFELConfig) -> int | None:
+    """The latest run before `run_number` with a freshly optimized geometry and its cell statistics."""
+
+    candidates = []
+    for run_dir in cfg.geometry_optimization_directory.glob("run[0-9]*"):
+        if not run_dir.name[3:].isdigit():
+            continue
+        run = int(run_dir.name[3:])
+        if run < run_number and (run_dir / f"{run:04d}_optimized.geom").exists() and (run_dir / "cell_stats.json").exists():
+            candidates.append(run)
+
+    return max(candidates, default=None)
+
+
+def probe_geometry_reuse(run_number: int, reference_run: int, cfg: config.SwissFELConfig) -> bool:
+    """
+    Index a small subsample of `run_number` with the optimized geometry of `reference_run`
+    and decide whether that geometry can be reused instead of running a clen scan.
+    """
+
+    geo = cfg.geometry_optimization
+    reference_dir = cfg.geometry_optimization_directory / f"run{reference_run:04d}"
+    reference_geometry = reference_dir / f"{reference_run:04d}_optimized.geom"
+    reference_stats = reference_dir / "cell_stats.json"
+
+    if not (reference_geometry.exists() and reference_stats.exists()):
+        return False
+
+    working_dir = cfg.geometry_optimization_directory / f"run{run_number:04d}"
+    probe_dir = working_dir / "reuse-probe"
+    probe_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        probe_list = geometry.subsample_lst_file(combined_dark_list(run_number, working_dir, cfg), geo.reuse_probe_size)
+        probe_stream = probe_dir / f"probe-run{reference_run:04d}.stream"
+
+        executor = executors.get_executor(cfg)
+        job_id = index.launch_indexing_job(
+            list_file=probe_list,
+            geometry_file=reference_geometry,
+            output_stream_path=probe_stream,
+            config=cfg,
+            executor=executor,
+        )
+        executor.wait({job_id})
+
+        result = compare_to_reference(subset.index_stream(streamio.resolve_stream_path(probe_stream)), reference_stats, geo)
+
+    except Exception as e:
+        print(f" !!!  Error probing run {run_number} with the geometry of run {reference_run}... scanning instead")
+        print(e)
+        print("")
+        return False
+
+    result["reference_run"] = reference_run
+    with (probe_dir / "probe.json").open("w") as f:
+        json.dump(result, f, indent=2)
+
+    return result["reusable"]
+
 
 def main():
     parser = argparse.ArgumentParser(description="Optimize detector geometry for each run.")
     parser.add_argument("config", type=Path, help="Path to the YAML config file.")
+    parser.add_argument("--no-reuse", action="store_true", help="Always run the full clen scan, never probe for reuse.")
     args = parser.parse_args()
 
     cfg = config.SwissFELConfig.from_yaml(args.config)
+    reuse = cfg.geometry_optimization.reuse_geometry and not args.no_reuse
+
+    # the most recent run with a freshly optimized geometry, possibly from an earlier invocation
+    reference_run = nearest_reference_run(cfg.geometry_optimization.run_range[0], cfg) if reuse else None
 
     for run_number in range(*cfg.geometry_optimization.run_range):
-        optimize_run_geometry(run_number, cfg)
+
+        if reuse and reference_run is not None and probe_geometry_reuse(run_number, reference_run, cfg):
+            print(f"run {run_number}: geometry of run {reference_run} still fits, skipping the clen scan")
+            geometry.update_geometry_summary(cfg, run_number, reference_run)
+            continue
+
+        if optimize_run_geometry(run_number, cfg):
+            reference_run = run_number
+
+    executors.get_executor(cfg).shutdown()
 
 
 if __name__ == "__main__":
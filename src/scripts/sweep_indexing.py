@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import argparse
+from pathlib import Path
+
+from .. import config, executors, geometry, sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep indexing parameters on a subsample of one run and rank them.")
+    parser.add_argument("config", type=Path, help="Path to the YAML config file (with a `sweep` section).")
+    parser.add_argument("run", type=int, help="Run whose images are subsampled.")
+    parser.add_argument("--laser-state", default="dark", help="Laser state of the images to use.")
+    parser.add_argument("--working-dir", type=Path, help="Where to put the sweep (default: ./indexing-sweep-runNNNN).")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed, for random sweeps.")
+    parser.add_argument("--rank-only", action="store_true", help="Do not index; only rank an existing sweep.")
+    args = parser.parse_args()
+
+    cfg = config.SwissFELConfig.from_yaml(args.config)
+    if cfg.sweep is None:
+        parser.error("the config has no `sweep` section")
+
+    working_dir = args.working_dir or Path(f"indexing-sweep-run{args.run:04d}")
+    working_dir.mkdir(parents=True, exist_ok=True)
+
+    if not args.rank_only:
+        points = sweep.parameter_points(cfg.sweep.parameters, cfg.sweep.mode, cfg.sweep.n_samples, seed=args.seed)
+
+        try:
+            geometry_file = geometry.geometry_file_for_run(args.run, cfg)
+        except (ValueError, IOError, FileNotFoundError):
+            print(f"no optimized geometry for run {args.run}, using {cfg.initial_geometry_file_path}")
+            geometry_file = cfg.initial_geometry_file_path
+
+        # keep the list (and so its subsample) inside the sweep, clear of other runs' sweeps
+        list_file = working_dir / f"run{args.run:04d}_all_{args.laser_state}.lst"
+        if not list_file.exists():
+            with list_file.open("w") as outfile:
+                for lst_file in config.get_list_files_for_run(run_number=args.run, config=cfg, laser_state=args.laser_state):
+                    outfile.write(lst_file.read_text())
+
+        sweep.launch_indexing_sweep(
+            working_dir=working_dir,
+            list_file=list_file,
+            geometry_file=geometry_file,
+            cfg=cfg,
+            points=points,
+            subsample_size=cfg.sweep.sample_size,
+        )
+        executors.get_executor(cfg).shutdown()
+
+    ranking = sweep.rank_sweep(working_dir)
+    ranking.to_csv(working_dir / "sweep_ranking.csv", index=False)
+
+    print(ranking.head(10).to_string(index=False))
+    print(f"\nfull ranking: {working_dir / 'sweep_ranking.csv'}")
+
+
+if __name__ == "__main__":
+    main()
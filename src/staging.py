@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from . import config
+
+
+def scratch_preamble(cfg: config.SwissFELConfig) -> str:
+    """
+    Shell snippet that makes a private scratch directory on the node (`$SCRATCH`) and
+    defines `stage_out SRC DEST`.
+
+    `stage_out` copies next to DEST, compares sha256 sums and renames into place, so
+    readers on the shared filesystem only ever see complete files. The snippet also sets
+    `-e`: if any step fails the job stops before staging out and the EXIT trap removes
+    the scratch directory and any half-copied file.
+    """
+
+    return f"""set -e
+
+SCRATCH=$(mktemp -d "{cfg.executor.scratch_directory}/crystred.XXXXXX")
+STAGE_TMP=""
+trap 'rm -rf "$SCRATCH" ${{STAGE_TMP:+"$STAGE_TMP"}}' EXIT
+
+stage_out() {{
+    STAGE_TMP="$2.partial.$$"
+    cp "$1" "$STAGE_TMP"
+    if [ "$(sha256sum < "$1")" != "$(sha256sum < "$STAGE_TMP")" ]; then
+        echo "checksum mismatch while staging $1 to $2" >&2
+        exit 1
+    fi
+    mv -f "$STAGE_TMP" "$2"
+    STAGE_TMP=""
+}}
+"""
+
+
+def stage_out(source: str | Path, destination: str | Path) -> str:
+    return f'stage_out "{source}" "{destination}"'
@@ -0,0 +1,250 @@
+"""
+Reading and writing CrystFEL stream files, plain or compressed.
+
+A compressed stream (`.stream.zst` or `.stream.gz`) is a sequence of independent
+zstd frames / gzip members: one for the stream header, then one per block of
+`chunks_per_block` chunks. Concatenated frames are still a valid .zst/.gz file, so
+`zstd -dc` / `zcat` reproduce the original stream byte for byte. Next to it lives a
+JSON index (`<name>.idx`) with the compressed and uncompressed offsets of each block
+and the uncompressed offset of each chunk, which is what makes random access cheap.
+"""
+
+import bisect
+import gzip
+import io
+import json
+import os
+import shutil
+from glob import glob
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+CHUNK_BEGIN = b"----- Begin chunk -----"
+CHUNK_END = b"----- End chunk -----"
+
+CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+STREAM_SUFFIXES = (".stream", ".stream.zst", ".stream.gz")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("reading or writing .zst streams needs the `zstandard` package") from e
+    return zstandard
+
+
+def codec_for_path(path: str | Path) -> str | None:
+    """Return "zstd", "gzip" or None (plain text) based on the file name."""
+    name = str(path)
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if name.endswith(".stream" + suffix):
+            return codec
+    return None
+
+
+def index_path(path: str | Path) -> Path:
+    return Path(f"{path}.idx")
+
+
+def resolve_stream_path(path: str | Path) -> Path:
+    """
+    Given the plain `.stream` path of a stream, return whichever variant exists on disk
+    (plain first, then compressed). If none exists, the plain path is returned.
+    """
+    path = Path(path)
+    for suffix in STREAM_SUFFIXES:
+        candidate = path.with_name(path.name.removesuffix(".stream") + suffix)
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def glob_streams(pattern: str) -> list[str]:
+    """
+    Like `glob(pattern)` for a pattern ending in `.stream`, but also finding compressed
+    streams. When both variants of a stream exist only one is returned.
+    """
+    if not pattern.endswith(".stream"):
+        raise ValueError(f"stream glob pattern must end in `.stream`: {pattern}")
+
+    found: dict[str, str] = {}
+    for suffix in STREAM_SUFFIXES:
+        for match in glob(pattern.removesuffix(".stream") + suffix):
+            found.setdefault(match.removesuffix(suffix), match)
+
+    return sorted(found.values())
+
+
+def open_stream(path: str | Path, mode: str = "r") -> io.IOBase:
+    """
+    Open a stream for sequential reading, transparently decompressing it.
+    `mode` is "r" (text) or "rb" (bytes).
+    """
+
+    if mode not in ("r", "rb"):
+        raise ValueError(f"streams can only be opened for reading, not {mode!r}")
+
+    codec = codec_for_path(path)
+    if codec is None:
+        return open(path, mode)
+
+    if codec == "gzip":
+        raw = gzip.open(path, "rb")
+    else:
+        raw = _zstd().ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        raw = io.BufferedReader(raw)
+
+    if mode == "rb":
+        return raw
+    return io.TextIOWrapper(raw)
+
+
+def iter_chunks(path: str | Path) -> Iterator[str]:
+    """Yield the text of every chunk in a stream, including the begin/end markers."""
+    with open_stream(path, "rb") as f:
+        chunk: list[bytes] = []
+        in_chunk = False
+        for line in f:
+            if line.startswith(CHUNK_BEGIN):
+                in_chunk = True
+            if in_chunk:
+                chunk.append(line)
+            if line.startswith(CHUNK_END):
+                yield b"".join(chunk).decode()
+                chunk = []
+                in_chunk = False
+
+
+def load_index(path: str | Path) -> dict:
+    with index_path(path).open("r") as f:
+        return json.load(f)
+
+
+def read_chunk(path: str | Path, chunk_number: int) -> str:
+    """Return the text of one chunk of a compressed stream, decompressing one block."""
+
+    idx = load_index(path)
+    chunk_offsets = idx["chunks"]
+    if not 0 <= chunk_number < len(chunk_offsets):
+        raise IndexError(f"stream {path} has {len(chunk_offsets)} chunks, not {chunk_number + 1}")
+
+    block_first_chunks = [b[4] for b in idx["blocks"]]
+    compressed_offset, compressed_size, block_offset, block_size, first_chunk = \
+        idx["blocks"][bisect.bisect_right(block_first_chunks, chunk_number) - 1]
+
+    with open(path, "rb") as f:
+        f.seek(compressed_offset)
+        block = _decompress(idx["codec"], f.read(compressed_size))
+
+    start = chunk_offsets[chunk_number] - block_offset
+    if chunk_number + 1 < len(chunk_offsets) and chunk_offsets[chunk_number + 1] < block_offset + block_size:
+        end = chunk_offsets[chunk_number + 1] - block_offset
+    else:
+        end = block_size
+
+    return block[start:end].decode()
+
+
+def _compress(codec: str, data: bytes, level: int | None) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError(f"unknown stream codec: {codec}")
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown stream codec: {codec}")
+
+
+def compress_stream(
+    source: str | Path,
+    destination: str | Path | None = None,
+    *,
+    codec: str = "zstd",
+    chunks_per_block: int = 256,
+    level: int | None = None,
+) -> Path:
+    """
+    Convert a plain `.stream` file into the block-compressed format plus its index.
+    Both files are written under temporary names and renamed into place at the end.
+    """
+
+    source = Path(source)
+    if destination is None:
+        destination = Path(f"{source}{CODEC_SUFFIXES[codec]}")
+    destination = Path(destination)
+
+    tmp_destination = destination.with_name(destination.name + ".partial")
+    tmp_index = index_path(destination).with_name(index_path(destination).name + ".partial")
+
+    blocks: list[list[int]] = []
+    chunk_offsets: list[int] = []
+
+    compressed_offset = 0
+    uncompressed_offset = 0
+
+    block: list[bytes] = []
+    block_size = 0
+    block_chunks = 0
+
+    with source.open("rb") as src, tmp_destination.open("wb") as dst:
+
+        def flush_block():
+            nonlocal compressed_offset, uncompressed_offset, block, block_size, block_chunks
+            if not block:
+                return
+            frame = _compress(codec, b"".join(block), level)
+            dst.write(frame)
+            blocks.append([compressed_offset, len(frame), uncompressed_offset, block_size, len(chunk_offsets) - block_chunks])
+            compressed_offset += len(frame)
+            uncompressed_offset += block_size
+            block, block_size, block_chunks = [], 0, 0
+
+        for line in src:
+            if line.startswith(CHUNK_BEGIN):
+                # the header gets a frame of its own, then every `chunks_per_block` chunks
+                if not chunk_offsets or block_chunks == chunks_per_block:
+                    flush_block()
+                chunk_offsets.append(uncompressed_offset + block_size)
+                block_chunks += 1
+            block.append(line)
+            block_size += len(line)
+
+        flush_block()
+
+    index = {
+        "codec": codec,
+        "uncompressed_size": uncompressed_offset,
+        "blocks": blocks,
+        "chunks": chunk_offsets,
+    }
+    with tmp_index.open("w") as f:
+        json.dump(index, f)
+
+    os.replace(tmp_destination, destination)
+    os.replace(tmp_index, index_path(destination))
+
+    return destination
+
+
+def decompress_stream(source: str | Path, output: BinaryIO) -> None:
+    """Write the plain text of a (possibly compressed) stream to a binary file object."""
+    with open_stream(source, "rb") as f:
+        shutil.copyfileobj(f, output, length=1 << 20)
+
+
+def cat_command(paths: list[Path], output: str) -> str:
+    """Shell command concatenating plain and compressed streams into one plain stream."""
+
+    if all(codec_for_path(p) is None for p in paths):
+        return f"cat {' '.join(str(p) for p in paths)} > {output}"
+
+    decompressors = {None: "cat", "gzip": "zcat", "zstd": "zstd -dcq"}
+    commands = "; ".join(f"{decompressors[codec_for_path(p)]} {p}" for p in paths)
+    return f"{{ {commands}; }} > {output}"
@@ -0,0 +1,328 @@
+import os
+import re
+import shutil
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from . import streamio
+
+CELL_PARAMETERS = ("a", "b", "c", "alpha", "beta", "gamma")
+
+CELL_PATTERN = re.compile(
+    rb"Cell parameters ([\d.]+) ([\d.]+) ([\d.]+) nm, ([\d.]+) ([\d.]+) ([\d.]+) deg"
+)
+_det_shift_pattern = re.compile(rb"predict_refine/det_shift x = ([-\d.]+) y = ([-\d.]+) mm")
+_run_pattern = re.compile(r"run(\d{4})")
+
+
+@dataclass(slots=True)
+class CrystalEntry:
+    start: int
+    end: int
+    cell: tuple[float, ...] | None = None
+    det_shift: tuple[float, float] | None = None
+
+
+@dataclass(slots=True)
+class ChunkEntry:
+    start: int
+    end: int
+    filename: str = ""
+    event: str = ""
+    hit: bool | None = None
+    indexed_by: str = "none"
+    crystals: list[CrystalEntry] = field(default_factory=list)
+
+    @property
+    def run(self) -> int | None:
+        match = _run_pattern.search(self.filename)
+        return int(match.group(1)) if match else None
+
+
+@dataclass(slots=True)
+class StreamIndex:
+    path: Path
+    header_end: int
+    chunks: list[ChunkEntry]
+
+    def crystals(self) -> Iterator[CrystalEntry]:
+        for chunk in self.chunks:
+            yield from chunk.crystals
+
+    @property
+    def n_hits(self) -> int:
+        return sum(1 for chunk in self.chunks if chunk.hit)
+
+    @property
+    def n_indexed(self) -> int:
+        # images with at least one crystal
+        return sum(1 for chunk in self.chunks if chunk.crystals)
+
+
+def index_stream(path: str | Path) -> StreamIndex:
+    """
+    One pass over a (plain or compressed) stream recording the byte range and metadata
+    of every chunk and crystal. Peak lists and reflection blocks are skipped over
+    without being parsed. Offsets refer to the uncompressed text.
+    """
+
+    chunks: list[ChunkEntry] = []
+    header_end = None
+
+    chunk = None
+    crystal = None
+    skip_until = None
+    offset = 0
+
+    with streamio.open_stream(path, "rb") as f:
+        for line in f:
+            start = offset
+            offset += len(line)
+
+            if skip_until is not None:
+                if line.startswith(skip_until):
+                    skip_until = None
+                continue
+
+            if line.startswith(b"Reflections measured after indexing"):
+                skip_until = b"End of reflections"
+            elif line.startswith(b"Peaks from peak search"):
+                skip_until = b"End of peak list"
+
+            elif line.startswith(streamio.CHUNK_BEGIN):
+                if header_end is None:
+                    header_end = start
+                chunk = ChunkEntry(start=start, end=start)
+            elif line.startswith(streamio.CHUNK_END) and chunk is not None:
+                chunk.end = offset
+                chunks.append(chunk)
+                chunk = None
+
+            elif chunk is None:
+                continue
+
+            elif line.startswith(b"--- Begin crystal"):
+                crystal = CrystalEntry(start=start, end=start)
+            elif line.startswith(b"--- End crystal") and crystal is not None:
+                crystal.end = offset
+                chunk.crystals.append(crystal)
+                crystal = None
+
+            elif crystal is not None:
+                if line.startswith(b"Cell parameters"):
+                    match = CELL_PATTERN.match(line)
+                    if match:
+                        crystal.cell = tuple(float(v) for v in match.groups())
+                elif line.startswith(b"predict_refine/det_shift"):
+                    match = _det_shift_pattern.match(line)
+                    if match:
+                        crystal.det_shift = (float(match.group(1)), float(match.group(2)))
+
+            elif line.startswith(b"Image filename:"):
+                chunk.filename = line.split(b":", 1)[1].strip().decode()
+            elif line.startswith(b"Event:"):
+                chunk.event = line.split(b":", 1)[1].strip().decode()
+            elif line.startswith(b"hit = "):
+                chunk.hit = line[6:].strip() == b"1"
+            elif line.startswith(b"indexed_by = "):
+                chunk.indexed_by = line[13:].strip().decode()
+
+    return StreamIndex(path=Path(path), header_end=offset if header_end is None else header_end, chunks=chunks)
+
+
+def _event_key(filename: str, event: str) -> tuple[str, str]:
+    return filename, event.removeprefix("//")
+
+
+def read_event_list(path: str | Path) -> set[tuple[str, str]]:
+    """Read "<filename> //<event>" lines, as in .lst files and custom-split lists."""
+    events = set()
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                events.add(_event_key(fields[0], fields[1] if len(fields) > 1 else ""))
+    return events
+
+
+@dataclass
+class CrystalFilter:
+    """
+    Per-crystal selection. A crystal is kept only if it passes every criterion that is
+    set; chunks are kept if they keep at least one crystal.
+
+    `cell_ranges` maps a cell parameter name to an inclusive (min, max) range.
+    `cell_sigma` drops crystals with any cell parameter further than that many robust
+    standard deviations (1.4826 * MAD) from the median over all input crystals.
+    """
+
+    run_range: tuple[int, int] | None = None
+    indexing_methods: list[str] | None = None
+    exclude_events: set[tuple[str, str]] | None = None
+    cell_ranges: dict[str, tuple[float, float]] = field(default_factory=dict)
+    cell_sigma: float | None = None
+
+    def prepare(self, indexes: list[StreamIndex]) -> None:
+        """Turn `cell_sigma` into `cell_ranges` using the crystals of all inputs."""
+        if self.cell_sigma is None:
+            return
+
+        cells = [c.cell for idx in indexes for c in idx.crystals() if c.cell is not None]
+        if not cells:
+            return
+
+        for i, name in enumerate(CELL_PARAMETERS):
+            values = [cell[i] for cell in cells]
+            median = statistics.median(values)
+            sigma = 1.4826 * statistics.median(abs(v - median) for v in values)
+            if sigma == 0:
+                # most crystals agree exactly (e.g. a 90 deg angle): no spread to cut on
+                continue
+            low, high = median - self.cell_sigma * sigma, median + self.cell_sigma * sigma
+            if name in self.cell_ranges:
+                low, high = max(low, self.cell_ranges[name][0]), min(high, self.cell_ranges[name][1])
+            self.cell_ranges[name] = (low, high)
+
+    def keep_chunk(self, chunk: ChunkEntry) -> bool:
+        if self.run_range is not None:
+            run = chunk.run
+            if run is None or not self.run_range[0] <= run <= self.run_range[1]:
+                return False
+        if self.indexing_methods is not None:
+            if not any(method in chunk.indexed_by for method in self.indexing_methods):
+                return False
+        if self.exclude_events is not None:
+            if _event_key(chunk.filename, chunk.event) in self.exclude_events:
+                return False
+        return True
+
+    def keep_crystal(self, crystal: CrystalEntry) -> bool:
+        if not self.cell_ranges:
+            return True
+        if crystal.cell is None:
+            return False
+        for i, name in enumerate(CELL_PARAMETERS):
+            if name in self.cell_ranges:
+                low, high = self.cell_ranges[name]
+                if not low <= crystal.cell[i] <= high:
+                    return False
+        return True
+
+
+def selected_ranges(index: StreamIndex, crystal_filter: CrystalFilter, include_header: bool) -> tuple[list[tuple[int, int]], int]:
+    """
+    Byte ranges of `index.path` making up the filtered stream, and the number of crystals
+    kept. A chunk whose crystals are only partly selected is copied minus the byte ranges
+    of the dropped crystals. Adjacent ranges are coalesced.
+    """
+
+    ranges: list[tuple[int, int]] = []
+    n_crystals = 0
+
+    def add(start, end):
+        if end <= start:
+            return
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+
+    if include_header:
+        add(0, index.header_end)
+
+    for chunk in index.chunks:
+        if not chunk.crystals or not crystal_filter.keep_chunk(chunk):
+            continue
+
+        kept = [crystal_filter.keep_crystal(c) for c in chunk.crystals]
+        if not any(kept):
+            continue
+        n_crystals += sum(kept)
+
+        position = chunk.start
+        for crystal, keep in zip(chunk.crystals, kept):
+            if not keep:
+                add(position, crystal.start)
+                position = crystal.end
+        add(position, chunk.end)
+
+    return ranges, n_crystals
+
+
+def _skip(f: BinaryIO, n: int) -> None:
+    while n > 0:
+        skipped = len(f.read(min(n, 1 << 20)))
+        if skipped == 0:
+            break
+        n -= skipped
+
+
+class _LimitedReader:
+    def __init__(self, f: BinaryIO, n: int):
+        self.f = f
+        self.remaining = n
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def copy_ranges(source: str | Path, ranges: Iterable[tuple[int, int]], output: BinaryIO) -> None:
+    """
+    Append byte ranges of `source` to the unbuffered binary file `output`. Plain files are
+    copied in the kernel with `os.copy_file_range` (or `os.sendfile`); compressed streams
+    are decompressed sequentially and the ranges cut out on the way.
+    """
+
+    out_fd = output.fileno()
+
+    if streamio.codec_for_path(source) is not None:
+        with streamio.open_stream(source, "rb") as f:
+            position = 0
+            for start, end in ranges:
+                _skip(f, start - position)
+                shutil.copyfileobj(_LimitedReader(f, end - start), output, length=1 << 20)
+                position = end
+        return
+
+    with open(source, "rb", buffering=0) as f:
+        in_fd = f.fileno()
+        for start, end in ranges:
+            offset, remaining = start, end - start
+            while remaining > 0:
+                try:
+                    copied = os.copy_file_range(in_fd, out_fd, remaining, offset_src=offset)
+                except (AttributeError, OSError):
+                    copied = os.sendfile(out_fd, in_fd, offset, remaining)
+                if copied == 0:
+                    raise IOError(f"unexpected end of {source} at byte {offset}")
+                offset += copied
+                remaining -= copied
+
+
+def filter_streams(inputs: list[Path], output: Path, crystal_filter: CrystalFilter) -> int:
+    """
+    Write the crystals of `inputs` selected by `crystal_filter` into one new stream,
+    with the header of the first input. Returns the number of crystals written.
+    """
+
+    indexes = [index_stream(path) for path in inputs]
+    crystal_filter.prepare(indexes)
+
+    n_crystals = 0
+    tmp_output = output.with_name(output.name + ".partial")
+
+    with open(tmp_output, "wb", buffering=0) as out:
+        for i, index in enumerate(indexes):
+            ranges, n = selected_ranges(index, crystal_filter, include_header=(i == 0))
+            copy_ranges(index.path, ranges, out)
+            n_crystals += n
+
+    os.replace(tmp_output, output)
+
+    return n_crystals
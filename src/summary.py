@@ -0,0 +1,120 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import config
+from . import streamio
+from . import subset
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# streams written by index-all-runs: <stream_file_directory>/runNNNN/runNNNN-<laser_state>.stream
+RUN_STREAM_PATTERN = re.compile(r"run(\d+)-(\w+)\.stream")
+SOURCE_COLUMNS = ["run_number", "laser_state", "stream", "stream_mtime_ns", "stream_size"]
+SUMMARY_COLUMNS = SOURCE_COLUMNS + [
+    "images", "hits", "indexed", "crystals", "indexing_rate",
+] + [f"median_{p}" for p in subset.CELL_PARAMETERS]
+
+
+def index_summary_path(cfg: config.SwissFELConfig) -> Path:
+    return cfg.stream_file_directory / "index_summary.csv"
+
+
+def find_run_streams(cfg: config.SwissFELConfig) -> list[dict]:
+    """Every per-run stream under `stream_file_directory`, with what identifies its current version."""
+
+    run_streams = []
+    for path in streamio.glob_streams(str(cfg.stream_file_directory / "run[0-9]*" / "run[0-9]*-*.stream")):
+        name = Path(path).name
+        for suffix in streamio.STREAM_SUFFIXES:
+            if name.endswith(suffix):
+                name = name.removesuffix(suffix) + ".stream"
+                break
+
+        match = RUN_STREAM_PATTERN.fullmatch(name)
+        if match is None:
+            continue
+
+        stat = os.stat(path)
+        run_streams.append({
+            "run_number": int(match.group(1)),
+            "laser_state": match.group(2),
+            "stream": str(path),
+            "stream_mtime_ns": stat.st_mtime_ns,
+            "stream_size": stat.st_size,
+        })
+
+    return run_streams
+
+
+def summarize_run_stream(run_stream: dict) -> dict:
+    """Hit and indexed counts, indexing rate and cell medians of one run stream."""
+
+    from . import cellstats
+
+    stream_index = subset.index_stream(run_stream["stream"])
+
+    cells = cellstats.accumulate_index(stream_index)
+
+    n_images = len(stream_index.chunks)
+    n_indexed = stream_index.n_indexed
+    stats = cells.summary()
+
+    return {
+        **run_stream,
+        "images": n_images,
+        "hits": stream_index.n_hits,
+        "indexed": n_indexed,
+        "crystals": cells.count,
+        "indexing_rate": n_indexed / n_images if n_images else float("nan"),
+        **{f"median_{p}": stats[f"median_{p}"] for p in cellstats.CELL_PARAMETERS},
+    }
+
+
+def load_index_summary(cfg: config.SwissFELConfig) -> "pd.DataFrame":
+    """The cached per-run indexing summary, as last written by `update_index_summary`."""
+    import pandas as pd
+
+    return pd.read_csv(index_summary_path(cfg))
+
+
+def update_index_summary(cfg: config.SwissFELConfig, processes: int | None = None, force: bool = False) -> "pd.DataFrame":
+    """
+    Bring the per-run indexing summary up to date. Only streams that are new or whose
+    size or modification time changed since the cached table was written are read again
+    (all of them with `force`); rows of streams that are gone are dropped.
+    """
+    import pandas as pd
+
+    summary_path = index_summary_path(cfg)
+    run_streams = find_run_streams(cfg)
+
+    if summary_path.exists() and not force and run_streams:
+        # a cached row is still valid if its stream is still there, unchanged
+        up_to_date = pd.read_csv(summary_path).merge(pd.DataFrame(run_streams), on=SOURCE_COLUMNS, how="inner")
+    else:
+        # every column, so an empty table (no run streams yet) still reads like a full one
+        up_to_date = pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    fresh_keys = set(zip(up_to_date["run_number"], up_to_date["laser_state"]))
+    stale = [s for s in run_streams if (s["run_number"], s["laser_state"]) not in fresh_keys]
+
+    print(f"{len(up_to_date)} run streams unchanged, summarizing {len(stale)}")
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            new_rows = pd.DataFrame(list(pool.map(summarize_run_stream, stale)), columns=SUMMARY_COLUMNS)
+        table = pd.concat([up_to_date, new_rows], ignore_index=True) if len(up_to_date) else new_rows
+    else:
+        table = up_to_date
+
+    table = table.sort_values(["run_number", "laser_state"]).reset_index(drop=True)
+
+    tmp_path = summary_path.with_name(summary_path.name + ".partial")
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, summary_path)
+
+    return table
@@ -0,0 +1,157 @@
+import itertools
+import json
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from . import config
+from . import executors
+from . import geometry
+from . import index
+from . import resources
+from . import streamio
+from . import subset
+
+SWEEPABLE_FIELDS = ("peak_threshold", "min_snr", "min_pixel_count", "integration_radius", "indexing_method")
+
+
+def parameter_points(
+    parameters: dict[str, list],
+    mode: str = "grid",
+    n_samples: int | None = None,
+    seed: int | None = None,
+) -> list[dict]:
+    """
+    The full grid over `parameters` (field -> values), or `n_samples` distinct points
+    drawn from it at random.
+    """
+
+    for name in parameters:
+        if name not in SWEEPABLE_FIELDS:
+            raise ValueError(f"cannot sweep `{name}`, only {SWEEPABLE_FIELDS}")
+
+    names = list(parameters)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(parameters[n] for n in names))]
+
+    if mode == "grid":
+        return grid
+    if mode == "random":
+        if n_samples is None:
+            raise ValueError("random sweeps need `n_samples`")
+        return random.Random(seed).sample(grid, min(n_samples, len(grid)))
+    raise ValueError(f"unknown sweep mode: {mode}")
+
+
+def config_for_point(cfg: config.SwissFELConfig, point: dict) -> config.SwissFELConfig:
+    indexing = config.IndexingConfig.model_validate({**cfg.indexing.model_dump(), **point})
+    return cfg.model_copy(update={"indexing": indexing})
+
+
+def launch_indexing_sweep(
+    *,
+    working_dir: Path,
+    list_file: Path,
+    geometry_file: Path,
+    cfg: config.SwissFELConfig,
+    points: list[dict],
+    subsample_size: int = 2000,
+    executor: executors.Executor | None = None,
+) -> None:
+    """
+    Index one subsample of `list_file` once per parameter point, all as one job array,
+    and wait for it. Point i goes to `working_dir/pointNNN/` with its parameters in
+    `point.json` and its stream in `point.stream`. Results of an earlier sweep in
+    `working_dir` are removed first, so they cannot be ranked under the new parameters.
+    """
+
+    if executor is None:
+        executor = executors.get_executor(cfg)
+
+    sample_list_file = geometry.subsample_lst_file(list_file, subsample_size)
+    n_images = resources.count_events(sample_list_file)
+
+    point_dirs = [working_dir / f"point{i:03d}" for i in range(len(points))]
+    for old_dir in Path(working_dir).glob("point*"):
+        if old_dir.is_dir() and old_dir not in point_dirs:
+            shutil.rmtree(old_dir)
+
+    script_texts = []
+    for point_dir, point in zip(point_dirs, points):
+        point_dir.mkdir(parents=True, exist_ok=True)
+        for suffix in streamio.STREAM_SUFFIXES:
+            (point_dir / f"point{suffix}").unlink(missing_ok=True)
+            streamio.index_path(point_dir / f"point{suffix}").unlink(missing_ok=True)
+
+        with (point_dir / "point.json").open("w") as f:
+            json.dump({"parameters": point, "n_images": n_images}, f)
+
+        script_texts.append(index.indexing_script(
+            list_file=sample_list_file,
+            geometry_file=geometry_file,
+            output_stream_path=point_dir / "point.stream",
+            config=config_for_point(cfg, point),
+            stage_to_scratch=cfg.executor.stage_to_scratch,
+        ))
+
+    print(f"indexing {n_images} images with {len(points)} parameter sets")
+
+    job_ids = executor.submit_array(
+        script_texts,
+        resources=resources.estimate_indexing_resources(sample_list_file, cfg),
+        jobname="indexing-sweep",
+    )
+    executor.wait(set(job_ids))
+
+
+def score_point(point_dir: Path) -> dict:
+    """Indexing rate and cell spread of one sweep point's stream."""
+
+    from . import cellstats
+
+    with (point_dir / "point.json").open("r") as f:
+        point = json.load(f)
+
+    stream_index = subset.index_stream(point_dir / "point.stream")
+
+    cells = cellstats.accumulate_index(stream_index)
+
+    n_indexed = stream_index.n_indexed
+    summary = cells.summary()
+
+    # relative spread of the cell lengths, so it is comparable between a, b and c
+    cell_spread = sum(summary[f"std_{p}"] / summary[f"mean_{p}"] for p in ("a", "b", "c")) / 3 if cells.count > 1 else float("nan")
+
+    return {
+        "point": point_dir.name,
+        **point["parameters"],
+        "images": point["n_images"],
+        "hits": stream_index.n_hits,
+        "indexed": n_indexed,
+        "crystals": cells.count,
+        "indexing_rate": n_indexed / point["n_images"] if point["n_images"] else float("nan"),
+        "cell_spread": cell_spread,
+        **{f"std_{p}": summary[f"std_{p}"] for p in cellstats.CELL_PARAMETERS},
+    }
+
+
+def rank_sweep(working_dir: Path, processes: int | None = None):
+    """
+    Score every finished point under `working_dir` and rank them: best indexing rate and
+    smallest cell spread both count, so `rank` is the mean of the two individual ranks.
+    """
+    import pandas as pd
+
+    point_dirs = sorted(p.parent for p in Path(working_dir).glob("point*/point.stream"))
+    if not point_dirs:
+        raise ValueError(f"no finished sweep points in {working_dir}")
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        scores = pd.DataFrame(list(pool.map(score_point, point_dirs)))
+
+    scores["rank"] = (
+        scores["indexing_rate"].rank(ascending=False) + scores["cell_spread"].rank(ascending=True)
+    ) / 2
+    scores = scores.sort_values(["rank", "indexing_rate"], ascending=[True, False]).reset_index(drop=True)
+
+    return scores
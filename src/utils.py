@@ -5,9 +5,28 @@ import re
 import subprocess
 
 
-def submit_job(job_file: Path, queue: str = "day", jobname: str = "indexing", time: str = "23:00:00") -> int:
+def submit_job(
+    job_file: Path,
+    queue: str = "day",
+    jobname: str = "indexing",
+    time: str = "23:00:00",
+    cpus: int = 36,
+    exclusive: bool = True,
+    mem_gb: int | None = None,
+    ntasks: int = 1,
+    array: str | None = None,
+) -> int:
 
-    submit_cmd = ["sbatch", "-p", queue, "--cpus-per-task=36", "--exclusive", f"--time={time}", "-J", jobname, job_file]
+    submit_cmd = ["sbatch", "-p", queue, f"--cpus-per-task={cpus}"]
+    if ntasks > 1:
+        submit_cmd += ["--nodes=1", f"--ntasks={ntasks}"]
+    if exclusive:
+        submit_cmd.append("--exclusive")
+    if mem_gb is not None:
+        submit_cmd.append(f"--mem={mem_gb}G")
+    if array is not None:
+        submit_cmd.append(f"--array={array}")
+    submit_cmd += [f"--time={time}", "-J", jobname, job_file]
     job_output = subprocess.check_output(submit_cmd)
 
     pattern = r"Submitted batch job (\d+)"